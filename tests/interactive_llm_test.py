@@ -7,6 +7,7 @@ This script allows you to chat directly with the Mistral-7B model.
 import os
 import sys
 import time
+from array import array
 from pathlib import Path
 
 # Add the voice_assistant directory to the path so we can import our modules
@@ -48,6 +49,9 @@ def interactive_chat(llm):
     print("-" * 50)
     
     conversation_history = []
+    # Response times are kept apart from the messages so stats need no pass over the history
+    response_times = array('d')
+    total_response_time = 0.0
     
     while True:
         try:
@@ -72,6 +76,8 @@ def interactive_chat(llm):
             # Check for clear command
             if user_input.lower() == 'clear':
                 conversation_history.clear()
+                del response_times[:]
+                total_response_time = 0.0
                 print("🗑️ Conversation history cleared")
                 continue
             
@@ -79,8 +85,8 @@ def interactive_chat(llm):
             if user_input.lower() == 'stats':
                 print(f"📊 Conversation Statistics:")
                 print(f"- Total messages: {len(conversation_history)}")
-                if conversation_history:
-                    avg_time = sum(msg['time'] for msg in conversation_history) / len(conversation_history)
+                if response_times:
+                    avg_time = total_response_time / len(response_times)
                     print(f"- Average response time: {avg_time:.2f} seconds")
                 continue
             
@@ -103,9 +109,10 @@ def interactive_chat(llm):
             # Store in conversation history
             conversation_history.append({
                 'user': user_input,
-                'assistant': response,
-                'time': elapsed_time
+                'assistant': response
             })
+            response_times.append(elapsed_time)
+            total_response_time += elapsed_time
             
         except KeyboardInterrupt:
             print("\n\n👋 Chat interrupted. Goodbye!")
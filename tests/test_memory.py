@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Conversation memory tests.
+
+These tests exercise the JSONL storage of ConversationMemory: the debounced
+flush of new turns and the recovery from failed writes.
+"""
+
+import sys
+import os
+import time
+
+import orjson
+import pytest
+
+# Add the src directory to the Python path so we can import the memory module
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'voice_assistant'))
+
+from features import memory as memory_module
+from features.memory import ConversationMemory
+
+def read_lines(path):
+    with open(path, 'rb') as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+@pytest.fixture
+def save_file(tmp_path):
+    return str(tmp_path / "conversation_memory.jsonl")
+
+@pytest.fixture
+def make_memory():
+    """Build ConversationMemory instances that are closed when the test ends."""
+    created = []
+
+    def make(**kwargs):
+        memory = ConversationMemory(**kwargs)
+        created.append(memory)
+        return memory
+
+    yield make
+    for memory in created:
+        memory.close()
+
+def test_add_conversation_is_debounced(save_file, make_memory):
+    """Turns are buffered and written together once flush_interval has passed."""
+    memory = make_memory(save_file=save_file, flush_interval=0.2)
+    memory.add_conversation("hi", "hello")
+    memory.add_conversation("how are you?", "fine")
+    assert not os.path.exists(save_file)
+
+    time.sleep(0.5)
+    assert read_lines(save_file) == [
+        {"user": "hi", "assistant": "hello"},
+        {"user": "how are you?", "assistant": "fine"},
+    ]
+
+def test_save_memory_flushes_immediately(save_file, make_memory):
+    """save_memory writes pending turns without waiting for the timer."""
+    memory = make_memory(save_file=save_file, flush_interval=60)
+    memory.add_conversation("hi", "hello")
+    memory.save_memory()
+    assert read_lines(save_file) == [{"user": "hi", "assistant": "hello"}]
+
+    # Nothing pending: a second flush must not duplicate lines
+    memory.save_memory()
+    assert len(read_lines(save_file)) == 1
+
+def test_failed_write_is_retried(save_file, monkeypatch, make_memory):
+    """Turns stay pending when the write fails and are written on the next flush."""
+    memory = make_memory(save_file=save_file, flush_interval=60)
+
+    def failing_open(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(memory_module, "open", failing_open, raising=False)
+    memory.add_conversation("hi", "hello")
+    memory.save_memory()
+    assert not os.path.exists(save_file)
+
+    monkeypatch.undo()
+    memory.add_conversation("still there?", "yes")
+    memory.save_memory()
+    assert read_lines(save_file) == [
+        {"user": "hi", "assistant": "hello"},
+        {"user": "still there?", "assistant": "yes"},
+    ]
+
+def test_load_memory_keeps_last_conversations(save_file, make_memory):
+    """Only the last max_conversations turns are kept for context, but all are counted."""
+    memory = make_memory(max_conversations=2, save_file=save_file)
+    for i in range(5):
+        memory.add_conversation(f"q{i}", f"a{i}")
+    memory.save_memory()
+
+    reloaded = make_memory(max_conversations=2, save_file=save_file)
+    assert reloaded.get_memory_info()["total_conversations"] == 5
+    assert [conv["user"] for conv in reloaded.conversations] == ["q3", "q4"]
+    assert "q4" in reloaded.get_context()
+
+@pytest.mark.parametrize("legacy_name", [
+    "conversation_memory.json",   # next to the new .jsonl save file
+    "conversation_memory.jsonl",  # old content under the new file name
+])
+@pytest.mark.parametrize("indent", [True, False])
+def test_legacy_json_is_migrated(tmp_path, legacy_name, indent, make_memory):
+    """Files in the old single-JSON format are converted to JSONL before loading."""
+    conversations = [{"user": "hi", "assistant": "hello"}, {"user": "bye", "assistant": "see you"}]
+    option = orjson.OPT_INDENT_2 if indent else 0
+    (tmp_path / legacy_name).write_bytes(orjson.dumps({"conversations": conversations}, option=option))
+    save_file = str(tmp_path / "conversation_memory.jsonl")
+
+    memory = make_memory(save_file=save_file)
+    assert list(memory.conversations) == conversations
+    assert read_lines(save_file) == conversations
+    assert not os.path.exists(save_file + ".tmp")
+
+    # New turns are appended as JSONL and the file loads again without re-migrating
+    memory.add_conversation("again", "sure")
+    memory.save_memory()
+    reloaded = make_memory(save_file=save_file)
+    assert reloaded.get_memory_info()["total_conversations"] == 3
+
+def test_legacy_json_as_save_file_is_converted_in_place(tmp_path, make_memory):
+    """A memory_file configured with the old .json name is rewritten in place as JSONL."""
+    save_file = tmp_path / "conversation_memory.json"
+    save_file.write_bytes(orjson.dumps({"conversations": [{"user": "hi", "assistant": "hello"}]}, option=orjson.OPT_INDENT_2))
+
+    memory = make_memory(save_file=str(save_file))
+    assert memory.get_memory_info()["total_conversations"] == 1
+    assert read_lines(save_file) == [{"user": "hi", "assistant": "hello"}]
+
+def test_single_jsonl_record_is_not_migrated(save_file, make_memory):
+    """A JSONL file holding one conversation is left alone."""
+    with open(save_file, 'wb') as f:
+        f.write(orjson.dumps({"user": "hi", "assistant": "hello"}) + b"\n")
+
+    memory = make_memory(save_file=save_file)
+    assert list(memory.conversations) == [{"user": "hi", "assistant": "hello"}]
+
+def test_close_flushes_and_releases_the_file(save_file, make_memory, monkeypatch):
+    """close() writes pending turns, closes the file and removes the exit hook."""
+    unregistered = []
+    monkeypatch.setattr(memory_module.atexit, "unregister", unregistered.append)
+
+    memory = make_memory(save_file=save_file, flush_interval=60)
+    memory.add_conversation("hi", "hello")
+    memory.close()
+
+    assert read_lines(save_file) == [{"user": "hi", "assistant": "hello"}]
+    assert memory._fp is None
+    assert unregistered == [memory.save_memory]
+
+def test_append_after_close_and_reopen(save_file, make_memory):
+    """Closing and reopening the save file keeps appending to the same JSONL history."""
+    memory = make_memory(save_file=save_file, flush_interval=60)
+    memory.add_conversation("q0", "a0")
+    memory.save_memory()
+    memory.close()
+
+    # The same instance reopens its handle on the next flush
+    memory.add_conversation("q1", "a1")
+    memory.save_memory()
+    memory.close()
+
+    # A new instance appends after the existing lines
+    reopened = make_memory(save_file=save_file, flush_interval=60)
+    assert reopened.get_memory_info()["total_conversations"] == 2
+    reopened.add_conversation("q2", "a2")
+    reopened.close()
+
+    assert [conv["user"] for conv in read_lines(save_file)] == ["q0", "q1", "q2"]
@@ -1,129 +1,136 @@
 #!/usr/bin/env python3
 """
-Weather feature test script.
+Weather feature tests.
 
-This script tests the weather functionality using the Open-Meteo provider
-which is free and doesn't require an API key.
+These tests exercise the weather functionality using the Open-Meteo provider
+which is free and doesn't require an API key. Run them with
+`pytest -n 4 tests/weather.py` to spread the cases over pytest-xdist workers.
 """
 
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
 
 # Add the src directory to the Python path so we can import the weather module
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'voice_assistant'))
 
 from features.weather import WeatherForecast
 
-def test_weather_queries():
+@pytest.fixture(scope="module")
+def weather():
+    """One Open-Meteo client shared by every test in this module (per xdist worker)."""
+    weather = WeatherForecast(provider="openmeteo")
+    yield weather
+    weather.close()
+
+@pytest.mark.parametrize("query", [
+    "What's the weather in Berlin now?",
+    "Is it raining now?",
+    "the weather in the evening?",
+    "the weather in London?",
+    "the weather tomorrow",
+    "the rain and day", # just to check errors from transcription
+    "when will the rain stop?"
+])
+def test_weather_queries(weather, query):
     """Test function for weather queries."""
-    try:
-        # Test with Open-Meteo (no API key needed)
-        print("Testing with Open-Meteo:")
-        weather = WeatherForecast(provider="openmeteo")
-        
-        test_queries = [
-            "What's the weather in Berlin now?",
-            "Is it raining now?",
-            "the weather in the evening?",
-            "the weather in London?",
-            "the weather tomorrow",
-            "the rain and day", # just to check errors from transcription
-            "when will the rain stop?"
-        ]
-        
-        for query in test_queries:
-            print(f"\nQuery: {query}")
-            response = weather.process_weather_query(query)
-            print(f"Response: {response}")
-            
-    except Exception as e:
-        print(f"Error: {e}")
-
-def test_current_weather():
+    print(f"\nQuery: {query}")
+    response = weather.process_weather_query(query)
+    print(f"Response: {response}")
+    assert response
+
+def test_current_weather(weather):
     """Test current weather functionality."""
-    try:
-        print("\n=== Testing Current Weather ===")
-        weather = WeatherForecast(provider="openmeteo")
-        
-        # Test current weather for different locations
-        locations = ["Berlin", "London", "New York", "Tokyo"]
-        
-        for location in locations:
-            print(f"\nGetting current weather for {location}:")
-            current_weather = weather.get_current_weather(location)
-            
-            if 'error' in current_weather:
-                print(f"Error: {current_weather['error']}")
-            else:
-                print(f"Temperature: {current_weather.get('temperature', 'N/A')}°C")
-                print(f"Description: {current_weather.get('description', 'N/A')}")
-                print(f"Humidity: {current_weather.get('humidity', 'N/A')}%")
-                print(f"Wind Speed: {current_weather.get('wind_speed', 'N/A')} m/s")
-                
-    except Exception as e:
-        print(f"Error in current weather test: {e}")
-
-def test_forecast():
+    print("\n=== Testing Current Weather ===")
+
+    # Test current weather for different locations
+    locations = ["Berlin", "London", "New York", "Tokyo"]
+
+    # The requests are network-bound, so fetch them concurrently and report in order
+    with ThreadPoolExecutor(max_workers=len(locations)) as ex:
+        results = list(ex.map(weather.get_current_weather, locations))
+
+    for location, current_weather in zip(locations, results):
+        print(f"\nGetting current weather for {location}:")
+        assert 'error' not in current_weather, current_weather.get('error')
+        print(f"Temperature: {current_weather.get('temperature', 'N/A')}°C")
+        print(f"Description: {current_weather.get('description', 'N/A')}")
+        print(f"Humidity: {current_weather.get('humidity', 'N/A')}%")
+        print(f"Wind Speed: {current_weather.get('wind_speed', 'N/A')} m/s")
+
+def test_forecast(weather):
     """Test forecast functionality."""
-    try:
-        print("\n=== Testing Weather Forecast ===")
-        weather = WeatherForecast(provider="openmeteo")
-        
-        # Test forecast for different time periods
-        location = "Berlin"
-        hours_list = [6, 12, 24]
-        
-        for hours in hours_list:
-            print(f"\nGetting {hours}-hour forecast for {location}:")
-            forecast = weather.get_forecast(location, hours)
-            
-            if 'error' in forecast:
-                print(f"Error: {forecast['error']}")
-            else:
-                print(f"Location: {forecast.get('location', 'N/A')}")
-                print(f"Number of forecast entries: {len(forecast.get('forecast', []))}")
-                
-                # Show first few entries
-                for i, entry in enumerate(forecast.get('forecast', [])[:3]):
-                    print(f"  {i+1}. {entry.get('time', 'N/A')}: {entry.get('temperature', 'N/A')}°C, {entry.get('description', 'N/A')}")
-                
-    except Exception as e:
-        print(f"Error in forecast test: {e}")
-
-def test_weather_detection():
+    print("\n=== Testing Weather Forecast ===")
+
+    # Test forecast for different time periods
+    location = "Berlin"
+    hours_list = [6, 12, 24]
+
+    with ThreadPoolExecutor(max_workers=len(hours_list)) as ex:
+        results = list(ex.map(lambda hours: weather.get_forecast(location, hours), hours_list))
+
+    for hours, forecast in zip(hours_list, results):
+        print(f"\nGetting {hours}-hour forecast for {location}:")
+        assert 'error' not in forecast, forecast.get('error')
+        print(f"Location: {forecast.get('location', 'N/A')}")
+        print(f"Number of forecast entries: {len(forecast.get('forecast', []))}")
+
+        # Show first few entries
+        for i, entry in enumerate(forecast.get('forecast', [])[:3]):
+            print(f"  {i+1}. {entry.get('time', 'N/A')}: {entry.get('temperature', 'N/A')}°C, {entry.get('description', 'N/A')}")
+
+@pytest.mark.parametrize("text, expected", [
+    ("What's the weather like?", True),
+    ("How hot is it today?", True),
+    ("Is it going to rain tomorrow?", True),
+    ("What's the temperature in Paris?", True),
+    ("Hello, how are you?", False),  # Non-weather query
+    ("What time is it?", False),     # Non-weather query
+    ("The weather is nice today", True),
+    ("Temperature is 25 degrees", True),
+    ("It's raining outside", True),
+])
+def test_weather_detection(weather, text, expected):
     """Test weather query detection."""
-    try:
-        print("\n=== Testing Weather Query Detection ===")
-        weather = WeatherForecast(provider="openmeteo")
-        
-        test_texts = [
-            "What's the weather like?",
-            "How hot is it today?",
-            "Is it going to rain tomorrow?",
-            "What's the temperature in Paris?",
-            "Hello, how are you?",  # Non-weather query
-            "What time is it?",     # Non-weather query
-            "The weather is nice today",
-            "Temperature is 25 degrees",
-            "It's raining outside",
-        ]
-        
-        for text in test_texts:
-            is_weather = weather._is_weather_query(text)
-            print(f"'{text}' -> Weather query: {is_weather}")
-            
-    except Exception as e:
-        print(f"Error in weather detection test: {e}")
+    is_weather = weather._is_weather_query(text)
+    print(f"'{text}' -> Weather query: {is_weather}")
+    assert is_weather == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("what's the weather now", ('current', 'now')),
+    ("the weather this evening", ('current', 'this evening')),
+    ("the weather tomorrow evening", ('tomorrow_evening', 'tomorrow evening')),
+    ("will it rain in 3 hours", ('next_3_hours', 'in 3 hours')),
+    ("is there snow", ('current', None)),  # "now" inside "snow" is not a time phrase
+    # Several phrases: the table's precedence decides, not the order in the text
+    ("shower stop evening tonight this", ('night', 'tonight')),
+    ("morning or afternoon tomorrow", ('afternoon', 'afternoon')),
+])
+def test_time_reference(weather, text, expected):
+    """Test time phrase parsing."""
+    assert weather._parse_time_reference(text) == expected
+
+@pytest.mark.parametrize("cache_control, expected", [
+    (None, 60),                      # no header: default lifetime
+    ("public, max-age=900", 900),
+    ("max-age=0", 0),
+    ("no-store", 0),
+    ("no-cache, max-age=60", 0),
+    ("private", 0),                  # header without a lifetime: not cached
+])
+def test_response_ttl(weather, cache_control, expected):
+    """Test the response cache lifetime derived from Cache-Control."""
+    assert weather.provider._response_ttl(cache_control) == expected
+
+def test_geocoding_after_close(monkeypatch):
+    """A closed provider still geocodes; only the background pre-connect is skipped."""
+    weather = WeatherForecast(provider="openmeteo")
+    weather.close()
+    monkeypatch.setattr(weather.provider, "_get_json",
+                        lambda url, params: {"results": [{"latitude": 52.52, "longitude": 13.41}]})
+    assert weather.provider._fetch_coordinates("Berlin") == (52.52, 13.41)
 
 if __name__ == "__main__":
-    print("Weather Feature Test Suite")
-    print("=" * 50)
-    
-    # Run all tests
-    test_weather_queries()
-    test_current_weather()
-    test_forecast()
-    test_weather_detection()
-    
-    print("\n" + "=" * 50)
-    print("Test suite completed!") 
\ No newline at end of file
+    sys.exit(pytest.main([__file__, "-s"]))
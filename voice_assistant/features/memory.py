@@ -1,17 +1,36 @@
-import json
+import atexit
 import os
+import threading
+import time
+import orjson
 from collections import deque
 from pathlib import Path
+from typing import Iterator
 
 class ConversationMemory:
-    def __init__(self, max_conversations: int = 10, save_file: str = "./data/conversation_memory.json"):
+    def __init__(self, max_conversations: int = 10, save_file: str = "./data/conversation_memory.jsonl", flush_interval: float = 2.0):
         self.max_conversations = max_conversations
         # Limited deque for LLM context (last N conversations)
         self.conversations = deque(maxlen=max_conversations)
-        # Full list for persistent storage (all conversations)
-        self.all_conversations = []
+        # Number of conversations stored on disk; the full history is never held in RAM
+        self._total_count = 0
+        # Bumped whenever self.conversations changes; the formatted context is cached per version
+        self._version = 0
+        self._context_cache: tuple[int, str] | None = None
         project_root = Path(__file__).parents[1]  # Go up to project root
         self.save_file = str((project_root / save_file).resolve())
+        os.makedirs(os.path.dirname(self.save_file) or '.', exist_ok=True)
+        # Tracked instead of probing the filesystem on every get_memory_info call
+        self._file_exists = False
+        # Append handle for the JSONL file, opened lazily on first write
+        self._fp = None
+        # Encoded lines waiting to be written; flushed together after flush_interval seconds
+        self._pending = []
+        self._dirty_since: float | None = None
+        self._flush_interval = flush_interval
+        self._flush_timer = None
+        self._lock = threading.Lock()
+        atexit.register(self.save_memory)
         
         # Load existing conversations from file
         self.load_memory()
@@ -25,62 +44,142 @@ class ConversationMemory:
         
         # Add to limited deque for LLM context
         self.conversations.append(conversation)
+        self._version += 1
         
-        # Add to full list for persistent storage
-        self.all_conversations.append(conversation)
+        self._total_count += 1
         
-        # Save to file after each addition
-        self.save_memory()
+        # Queue the line and let the flush timer batch it with any following turns
+        with self._lock:
+            self._pending.append(orjson.dumps(conversation) + b"\n")
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+                self._flush_timer = threading.Timer(self._flush_interval, self.save_memory)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+            flush_now = time.monotonic() - self._dirty_since >= self._flush_interval
+        
+        if flush_now:
+            self.save_memory()
     
     def get_context(self) -> str:
         """Get formatted conversation history for LLM context (last N conversations only)"""
-        if not self.conversations:
-            return ""
+        version = self._version
+        cached = self._context_cache
+        if cached is not None and cached[0] == version:
+            return cached[1]
         
         context_parts = []
         for conv in self.conversations:
             context_parts.append(f"<|user|>\n{conv['user']}\n<|end|>")
             context_parts.append(f"<|assistant|>\n{conv['assistant']}\n<|end|>")
         
-        return "\n".join(context_parts)
+        context = "\n".join(context_parts)
+        self._context_cache = (version, context)
+        return context
     
     def save_memory(self):
-        """Save all conversations to JSON file"""
-        try:
-            with open(self.save_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    "conversations": self.all_conversations,  # Save all conversations
-                }, f, indent=2, ensure_ascii=False)
+        """Write all pending conversation lines to the save file in a single append"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._dirty_since = None
+            if not self._pending:
+                return
+            data = b"".join(self._pending)
             
-            print(f"Conversation memory saved to {self.save_file} ({len(self.all_conversations)} total conversations)")
-        except Exception as e:
-            print(f"Error saving conversation memory: {e}")
+            try:
+                if self._fp is None or self._fp.closed:
+                    self._fp = open(self.save_file, 'ab')
+                # One write per batch; flush so it reaches the file without waiting for close()
+                self._fp.write(data)
+                self._fp.flush()
+                self._file_exists = True
+                # Only drop the lines once they are on disk so a failed write is retried on the next flush
+                self._pending.clear()
+            except Exception as e:
+                print(f"Error saving conversation memory: {e}")
+                if self._fp is not None:
+                    try:
+                        self._fp.close()
+                    except Exception:
+                        pass
+                    # Reopen on the next attempt
+                    self._fp = None
+    
+    def close(self):
+        """Flush pending conversations, close the save file and drop the exit hook"""
+        atexit.unregister(self.save_memory)
+        self.save_memory()
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+    
+    @staticmethod
+    def _read_legacy_json(path: str) -> list | None:
+        """Return the conversations of a file in the old single-JSON format, or None for any other content"""
+        with open(path, 'rb') as f:
+            first_line = f.readline()
+            if not first_line.lstrip().startswith(b"{"):
+                return None
+            try:
+                # A complete object on the first line is a JSONL record unless it is a one-line legacy file
+                data = orjson.loads(first_line)
+            except orjson.JSONDecodeError:
+                try:
+                    data = orjson.loads(first_line + f.read())
+                except orjson.JSONDecodeError:
+                    return None
+        if isinstance(data, dict) and isinstance(data.get("conversations"), list):
+            return data["conversations"]
+        return None
+    
+    def _migrate_legacy_json(self):
+        """Convert a conversation file from the old single-JSON format to JSONL"""
+        if os.path.exists(self.save_file):
+            # Configs written for the old format may still point memory_file at the .json file itself
+            source = self.save_file
+        else:
+            source = os.path.splitext(self.save_file)[0] + ".json"
+            if source == self.save_file or not os.path.exists(source):
+                return
+        
+        conversations = self._read_legacy_json(source)
+        if conversations is None:
+            return
+        
+        # Write to a temporary file and rename it so an interrupted migration never leaves a partial save file
+        tmp_file = self.save_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(b"".join(orjson.dumps(conv) + b"\n" for conv in conversations))
+        os.replace(tmp_file, self.save_file)
+        print(f"Migrated conversation memory from {source} to {self.save_file}")
     
     def load_memory(self):
-        """Load conversations from JSON file"""
+        """Load conversations from JSONL file"""
         try:
+            self._migrate_legacy_json()
+            
             if os.path.exists(self.save_file):
-                with open(self.save_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                # Count every line but only keep (and parse) the last N
+                recent_lines = deque(maxlen=self.max_conversations)
+                self._total_count = 0
+                with open(self.save_file, 'rb') as f:
+                    for line in f:
+                        if line.strip():
+                            recent_lines.append(line)
+                            self._total_count += 1
                 
-                # Load all conversations
-                all_conversations_list = data.get("conversations", [])
-                self.all_conversations = all_conversations_list
+                self.conversations.clear()
+                for line in recent_lines:
+                    self.conversations.append(orjson.loads(line))
+                self._version += 1
                 
-                # Load only the last N conversations into the limited deque
-                recent_conversations = all_conversations_list[-self.max_conversations:] if all_conversations_list else []
-                for conv in recent_conversations:
-                    self.conversations.append(conv)
-                
-                print(f"Loaded {len(all_conversations_list)} total conversations, using last {len(self.conversations)} for context")
+                self._file_exists = True
+                print(f"Loaded {self._total_count} total conversations, using last {len(self.conversations)} for context")
             else:
                 print(f"No existing conversation memory file found at {self.save_file}")
-                
-            # Create the base directory for the save file if it doesn't exist
-            save_dir = os.path.dirname(self.save_file)
-            if save_dir and not os.path.exists(save_dir):
-                os.makedirs(save_dir, exist_ok=True)
-                print(f"Created directory: {save_dir}")
         except Exception as e:
             print(f"Error loading conversation memory: {e}")
             # Continue with empty memory if loading fails
@@ -88,13 +187,19 @@ class ConversationMemory:
     def get_memory_info(self) -> dict:
         """Get information about the current memory state"""
         return {
-            "total_conversations": len(self.all_conversations),
+            "total_conversations": self._total_count,
             "context_conversations": len(self.conversations),
             "max_conversations": self.max_conversations,
             "save_file": self.save_file,
-            "file_exists": os.path.exists(self.save_file)
+            "file_exists": self._file_exists
         }
     
-    def get_all_conversations(self) -> list:
-        """Get all stored conversations (for debugging/analysis)"""
-        return self.all_conversations.copy() 
\ No newline at end of file
+    def get_all_conversations(self) -> Iterator[dict]:
+        """Stream all stored conversations from the save file (for debugging/analysis)"""
+        self.save_memory()
+        if not os.path.exists(self.save_file):
+            return
+        with open(self.save_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
@@ -1,32 +1,384 @@
+import math
 import requests
-import json
+import orjson
 import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
 import logging
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+def _build_session() -> requests.Session:
+    """Create a pooled HTTP session so repeated calls reuse TCP/TLS connections."""
+    session = requests.Session()
+    # pool_connections is the number of hosts kept, pool_maxsize the sockets per host
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'})
+    return session
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)', re.IGNORECASE)
+_NO_CACHE_RE = re.compile(r'\b(?:no-store|no-cache)\b', re.IGNORECASE)
+
+# Fields of a forecast entry (besides 'time'), in the order entries list them
+_FORECAST_FIELDS = ('temperature', 'feels_like', 'humidity', 'description', 'wind_speed', 'precipitation')
+# All that rain analysis looks at
+_RAIN_FIELDS = ('description', 'precipitation')
+
+# "lat,lon" locations are used as-is without geocoding
+_COORDINATES_RE = re.compile(r'\s*(-?\d+(?:\.\d*)?)\s*,\s*(-?\d+(?:\.\d*)?)\s*')
+
+def _forecast_days(hours: int, max_days: int, now: datetime) -> int:
+    """Number of calendar days (starting today) needed to cover the `hours` hours after now."""
+    hours_into_window = now.hour + now.minute / 60 + hours
+    return min(max_days, max(1, int(hours_into_window // 24) + 1))
+
+def _window_end(start_time: datetime, count: int, hours: int, now: datetime) -> int:
+    """
+    Index just past the last hourly entry that is at most `hours` hours from now.
+    
+    Args:
+        start_time: Timestamp of the first entry
+        count: Number of hourly entries
+        hours: Length of the requested window
+        now: Current local time
+    """
+    seconds_into_window = (now - start_time).total_seconds() + hours * 3600
+    return max(0, min(count, int(seconds_into_window // 3600) + 1))
+
+# Weather-related keywords, matched as plain substrings of the lowercased text
+_WEATHER_KEYWORDS = (
+    'weather', 'temperature', 'forecast', 'rain', 'snow', 'sunny', 
+    'cloudy', 'hot', 'cold', 'humid', 'wind', 'storm', 'thunder',
+    'drizzle', 'fog', 'mist', 'hail', 'sleet', 'precipitation',
+    'degrees', 'celsius', 'fahrenheit', '°c', '°f'
+)
+_WEATHER_KEYWORDS_RE = re.compile("|".join(map(re.escape, _WEATHER_KEYWORDS)))
+
+# The keywords most weather queries contain; plain `in` checks settle those
+# without starting the regex engine
+_CHEAP_KEYWORDS = ('weather', 'temperature', 'forecast', 'rain')
+
+# Weather question patterns
+_WEATHER_PATTERNS = [re.compile(p) for p in (
+    r'\b(what\'?s?|how\'?s?)\s+(the\s+)?weather',
+    r'\b(is\s+it\s+)(raining|snowing|sunny|cloudy|hot|cold)',
+    r'\b(weather\s+)(in|for|at)',
+    r'\b(temperature\s+)(in|for|at)',
+    r'\b(forecast\s+)(for|in)',
+)]
+
+# Rain-specific patterns used to detect weather queries
+_RAIN_QUERY_PATTERNS = [re.compile(p) for p in (
+    r'\b(when\s+will\s+)(the\s+)?rain\s+(stop|end)',
+    r'\b(how\s+long\s+)(will\s+)?(it\s+)?(keep\s+)?(raining|rain)',
+    r'\b(is\s+it\s+)(still\s+)?(raining|going\s+to\s+rain)',
+    r'\b(when\s+does\s+)(the\s+)?rain\s+(stop|end)',
+    r'\b(rain\s+)(stop|end|continue)',
+)]
+
+# Rain keywords and timing words, matched as plain substrings like the weather keywords
+_RAIN_KEYWORDS_RE = re.compile("|".join(map(re.escape, (
+    'rain', 'raining', 'drizzle', 'shower', 'precipitation'
+))))
+_RAIN_TIMING_WORDS_RE = re.compile("|".join(map(re.escape, (
+    'when', 'how long', 'stop', 'end', 'continue', 'still'
+))))
+
+# Patterns for questions about when rain starts or stops
+_RAIN_TIMING_RE = re.compile("|".join((
+    r'\b(when\s+will\s+)(the\s+)?rain\s+(stop|end)',
+    r'\b(how\s+long\s+)(will\s+)?(it\s+)?(keep\s+)?(raining|rain)',
+    r'\b(is\s+it\s+)(still\s+)?(raining|going\s+to\s+rain)',
+    r'\b(when\s+does\s+)(the\s+)?rain\s+(stop|end)',
+    r'\b(rain\s+)(stop|end|continue)',
+    r'\b(will\s+)(it\s+)?(stop\s+)?(raining|rain)',
+    r'\b(how\s+much\s+)(longer\s+)?(will\s+)?(it\s+)?(rain|raining)',
+)))
+
+# Keywords first: they are the cheapest alternatives and match most queries
+_WEATHER_QUERY_RE = re.compile("|".join(
+    [_WEATHER_KEYWORDS_RE.pattern]
+    + [p.pattern for p in _RAIN_QUERY_PATTERNS]
+    + [p.pattern for p in _WEATHER_PATTERNS]
+))
+
+# Time phrases mapped to the time reference understood by get_weather_for_time.
+# When a query contains several phrases, the one listed first wins.
+_TIME_PERIODS = {
+    'now': 'current',
+    'today': 'current',
+    'tonight': 'night',
+    'this evening': 'current',
+    'this afternoon': 'current',
+    'this morning': 'current',
+    'evening': 'evening',
+    'afternoon': 'afternoon',
+    'morning': 'morning',
+    'night': 'night',
+    'tomorrow': 'tomorrow',
+    'tomorrow morning': 'tomorrow_morning',
+    'tomorrow afternoon': 'tomorrow_afternoon',
+    'tomorrow evening': 'tomorrow_evening',
+    'tomorrow night': 'tomorrow_night',
+    'next hour': 'next_hour',
+    'in an hour': 'next_hour',
+    'in 1 hour': 'next_hour',
+    'in 2 hours': 'next_2_hours',
+    'in 3 hours': 'next_3_hours',
+    'in 4 hours': 'next_4_hours',
+    'in 5 hours': 'next_5_hours',
+}
+# Longest phrases first so "tomorrow evening" is matched as one phrase, not "tomorrow" and "evening"
+_TIME_PERIOD_RE = re.compile(
+    r'\b(?:' + "|".join(map(re.escape, sorted(_TIME_PERIODS, key=len, reverse=True))) + r')\b'
+)
+_TIME_PERIOD_PRIORITY = {period: i for i, period in enumerate(_TIME_PERIODS)}
+
+# time_reference -> (days ahead, hour of day) of the forecast hour it refers to;
+# an hour of None keeps the current time of day
+_TIME_REFERENCE_TARGETS = {
+    'morning': (0, 9),            # Morning is typically 8 AM to 11 AM
+    'afternoon': (0, 14),         # Afternoon is typically 2 PM to 5 PM
+    'evening': (0, 18),           # Evening is typically 6 PM to 9 PM
+    'night': (0, 22),             # Night is typically 10 PM to 6 AM
+    'tomorrow': (1, None),
+    'tomorrow_morning': (1, 9),
+    'tomorrow_afternoon': (1, 14),
+    'tomorrow_evening': (1, 18),
+    'tomorrow_night': (1, 22),
+}
+# 'next_hour', 'next_2_hours', ...
+_NEXT_HOURS_RE = re.compile(r'next_(?:(\d+)_)?hours?')
+
+# How the minute part of a spoken clock time is read out
+_MINUTE_WORDS = {
+    '00': " o'clock",
+    '15': ' quarter past',
+    '30': ' thirty',
+    '45': ' quarter to',
+}
+
+# Known cities in lookup precedence: Berlin, other German cities, then international ones
+_KNOWN_CITIES = (
+    'berlin',
+    'munich', 'hamburg', 'cologne', 'frankfurt', 'stuttgart',
+    'düsseldorf', 'dortmund', 'leipzig', 'bremen', 'dresden',
+    'london', 'paris', 'new york', 'tokyo', 'sydney',
+)
+_CITY_PRIORITY = {city: rank for rank, city in enumerate(_KNOWN_CITIES)}
+_CITY_RE = re.compile("|".join(map(re.escape, _KNOWN_CITIES)))
+
+# Coordinates of the known cities (as returned by Open-Meteo geocoding), so the
+# locations _extract_location can produce never need a geocoding request
+_KNOWN_COORDINATES: Dict[str, Tuple[float, float]] = {
+    'berlin': (52.52437, 13.41053),
+    'munich': (48.13743, 11.57549),
+    'hamburg': (53.55073, 9.99302),
+    'cologne': (50.93333, 6.95),
+    'frankfurt': (50.11552, 8.68417),
+    'stuttgart': (48.78232, 9.17702),
+    'düsseldorf': (51.22172, 6.77616),
+    'dortmund': (51.51494, 7.466),
+    'leipzig': (51.33962, 12.37129),
+    'bremen': (53.07516, 8.80777),
+    'dresden': (51.05089, 13.73832),
+    'london': (51.50853, -0.12574),
+    'paris': (48.85341, 2.3488),
+    'new york': (40.71427, -74.00597),
+    'tokyo': (35.6895, 139.69171),
+    'sydney': (-33.86785, 151.20732),
+}
+
 class WeatherProvider(ABC):
     """Abstract base class for weather providers."""
     
+    # Lifetime of a cached response when the server sends no Cache-Control header at all
+    DEFAULT_RESPONSE_TTL = 60
+    RESPONSE_CACHE_SIZE = 256
+    
+    def __init__(self):
+        self.session = _build_session()
+        # (url, params) -> (expiry on the monotonic clock, decoded body), oldest first
+        self._response_cache: OrderedDict = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+    
+    def _response_ttl(self, cache_control: Optional[str]) -> int:
+        """
+        Seconds a response may be reused for, following its Cache-Control header.
+        
+        Args:
+            cache_control: The Cache-Control header value, or None when it is missing
+            
+        Returns:
+            The lifetime in seconds; 0 means the response must not be cached
+        """
+        if cache_control is None:
+            return self.DEFAULT_RESPONSE_TTL
+        if _NO_CACHE_RE.search(cache_control):
+            return 0
+        match = _MAX_AGE_RE.search(cache_control)
+        return int(match.group(1)) if match else 0
+    
+    def _get_json(self, url: str, params: Dict) -> Dict:
+        """
+        GET a JSON endpoint, reusing a cached response while it is still fresh.
+        
+        Args:
+            url: Endpoint URL
+            params: Query parameters
+            
+        Returns:
+            The decoded response body
+        """
+        key = (url, tuple(sorted(params.items())))
+        now = time.monotonic()
+        with self._response_cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is not None and now < entry[0]:
+                self._response_cache.move_to_end(key)
+                return entry[1]
+        
+        response = self.session.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        ttl = self._response_ttl(response.headers.get('Cache-Control'))
+        if ttl > 0:
+            with self._response_cache_lock:
+                self._response_cache[key] = (now + ttl, data)
+                self._response_cache.move_to_end(key)
+                while len(self._response_cache) > self.RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+        return data
+    
+    def close(self):
+        """Close the pooled HTTP connections."""
+        self.session.close()
+    
     @abstractmethod
     def get_current_weather(self, location: str) -> Dict:
         pass
     
     @abstractmethod
-    def get_forecast(self, location: str, hours: int = 24) -> Dict:
+    def get_forecast(self, location: str, hours: int = 24, fields: Tuple[str, ...] = _FORECAST_FIELDS) -> Dict:
         pass
+    
+    def get_current_and_forecast(self, location: str, hours: int = 24, fields: Tuple[str, ...] = _FORECAST_FIELDS) -> Dict:
+        """
+        Get current conditions together with the hourly forecast.
+        
+        Providers whose forecast endpoint also returns current conditions
+        override this to make a single request.
+        
+        Returns:
+            The get_forecast result with the get_current_weather result under 'current'
+        """
+        forecast_data = self.get_forecast(location, hours, fields)
+        if 'error' in forecast_data:
+            return forecast_data
+        return {**forecast_data, 'current': self.get_current_weather(location)}
 
 class OpenMeteoProvider(WeatherProvider):
     """Open-Meteo weather provider (completely free, no API key required)."""
     
-    def __init__(self):
+    # WMO weather interpretation codes (read-only, shared by all instances)
+    _WMO_CODES: Mapping[int, str] = MappingProxyType({
+        0: "clear sky",
+        1: "mainly clear",
+        2: "partly cloudy",
+        3: "overcast",
+        45: "foggy",
+        48: "depositing rime fog",
+        51: "light drizzle",
+        53: "moderate drizzle",
+        55: "dense drizzle",
+        56: "light freezing drizzle",
+        57: "dense freezing drizzle",
+        61: "slight rain",
+        63: "moderate rain",
+        65: "heavy rain",
+        66: "light freezing rain",
+        67: "heavy freezing rain",
+        71: "slight snow fall",
+        73: "moderate snow fall",
+        75: "heavy snow fall",
+        77: "snow grains",
+        80: "slight rain showers",
+        81: "moderate rain showers",
+        82: "violent rain showers",
+        85: "slight snow showers",
+        86: "heavy snow showers",
+        95: "thunderstorm",
+        96: "thunderstorm with slight hail",
+        99: "thunderstorm with heavy hail"
+    })
+    
+    _CURRENT_FIELDS = 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m,pressure_msl,visibility'
+    # Forecast entry key -> Open-Meteo hourly variable it is built from
+    _HOURLY_FIELDS: Mapping[str, str] = MappingProxyType({
+        'temperature': 'temperature_2m',
+        'feels_like': 'apparent_temperature',
+        'humidity': 'relative_humidity_2m',
+        'description': 'weather_code',
+        'wind_speed': 'wind_speed_10m',
+        'precipitation': 'precipitation',
+    })
+    
+    def __init__(self, geocode_cache_size: int = 512):
+        super().__init__()
         self.base_url = "https://api.open-meteo.com/v1"
+        # Per-instance LRU cache so repeated locations skip the geocoding round-trip
+        self._geocode = lru_cache(maxsize=geocode_cache_size)(self._fetch_coordinates)
+        # Background worker that opens the forecast connection while geocoding runs
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="open-meteo")
+    
+    def close(self):
+        """Close the pooled HTTP connections and stop the pre-connect worker."""
+        self._executor.shutdown(wait=False)
+        super().close()
     
     def _get_coordinates(self, location: str) -> Tuple[float, float]:
+        """Get coordinates for a location, using cached results when available."""
+        match = _COORDINATES_RE.fullmatch(location)
+        if match:
+            return float(match.group(1)), float(match.group(2))
+        
+        key = location.strip().lower()
+        if key in _KNOWN_COORDINATES:
+            return _KNOWN_COORDINATES[key]
+        return self._geocode(key)
+    
+    def _warm_forecast_connection(self):
+        """Open a pooled connection to the forecast host so the real request can reuse it."""
+        try:
+            self.session.head(f"{self.base_url}/forecast", timeout=5)
+        except Exception as e:
+            logger.debug(f"Could not pre-connect to {self.base_url}: {e}")
+    
+    def _fetch_coordinates(self, location: str) -> Tuple[float, float]:
         """Get coordinates for a location using Open-Meteo geocoding."""
+        # Cache miss: overlap the forecast host's TCP/TLS setup with the geocoding call
+        try:
+            self._executor.submit(self._warm_forecast_connection)
+        except RuntimeError:
+            # Executor already shut down by close(); the pre-connect is only an optimization
+            pass
         try:
             geocoding_url = "https://geocoding-api.open-meteo.com/v1/search"
             params = {
@@ -36,10 +388,7 @@ class OpenMeteoProvider(WeatherProvider):
                 'format': 'json'
             }
             
-            response = requests.get(geocoding_url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_json(geocoding_url, params)
             
             if data.get('results'):
                 result = data['results'][0]
@@ -60,121 +409,130 @@ class OpenMeteoProvider(WeatherProvider):
             params = {
                 'latitude': lat,
                 'longitude': lon,
-                'current': 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m,pressure_msl,visibility',
+                'current': self._CURRENT_FIELDS,
                 'timezone': 'auto',
                 'forecast_days': 1
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+            data = self._get_json(url, params)
+            return self._parse_current(location, data['current'])
             
-            data = response.json()
-            current = data['current']
+        except Exception as e:
+            logger.error(f"Error fetching current weather: {e}")
+            return {'error': f"Failed to fetch weather data: {str(e)}"}
+    
+    def _parse_current(self, location: str, current: Dict) -> Dict:
+        """Convert an Open-Meteo 'current' block into a weather dictionary."""
+        return {
+            'location': location,
+            'temperature': round(current['temperature_2m']),
+            'feels_like': round(current['apparent_temperature']),
+            'humidity': current['relative_humidity_2m'],
+            'description': self._weather_code_to_description(current['weather_code']),
+            'wind_speed': current['wind_speed_10m'],
+            'pressure': current['pressure_msl'],
+            'visibility': current['visibility'] / 1000,  # Convert to km
+            'precipitation': current['precipitation'],
+            'timestamp': current['time']
+        }
+    
+    def get_forecast(self, location: str, hours: int = 24, fields: Tuple[str, ...] = _FORECAST_FIELDS) -> Dict:
+        """Get weather forecast for a location, requesting only the hourly variables behind fields."""
+        try:
+            now = datetime.now()
+            lat, lon = self._get_coordinates(location)
             
-            # Convert weather code to description
-            weather_description = self._weather_code_to_description(current['weather_code'])
+            url = f"{self.base_url}/forecast"
+            params = {
+                'latitude': lat,
+                'longitude': lon,
+                'hourly': ','.join(self._HOURLY_FIELDS[key] for key in fields),
+                'timezone': 'auto',
+                'forecast_days': _forecast_days(hours, max_days=7, now=now)
+            }
+            
+            data = self._get_json(url, params)
             
             return {
                 'location': location,
-                'temperature': round(current['temperature_2m']),
-                'feels_like': round(current['apparent_temperature']),
-                'humidity': current['relative_humidity_2m'],
-                'description': weather_description,
-                'wind_speed': current['wind_speed_10m'],
-                'pressure': current['pressure_msl'],
-                'visibility': current['visibility'] / 1000,  # Convert to km
-                'precipitation': current['precipitation'],
-                'timestamp': current['time']
+                **self._parse_hourly(data['hourly'], hours, fields, now)
             }
             
         except Exception as e:
-            logger.error(f"Error fetching current weather: {e}")
-            return {'error': f"Failed to fetch weather data: {str(e)}"}
+            logger.error(f"Error fetching forecast: {e}")
+            return {'error': f"Failed to fetch forecast data: {str(e)}"}
     
-    def get_forecast(self, location: str, hours: int = 24) -> Dict:
-        """Get weather forecast for a location."""
+    def get_current_and_forecast(self, location: str, hours: int = 24, fields: Tuple[str, ...] = _FORECAST_FIELDS) -> Dict:
+        """Get current conditions and the hourly forecast from a single /forecast request."""
         try:
+            now = datetime.now()
             lat, lon = self._get_coordinates(location)
             
             url = f"{self.base_url}/forecast"
             params = {
                 'latitude': lat,
                 'longitude': lon,
-                'hourly': 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m',
+                'current': self._CURRENT_FIELDS,
+                'hourly': ','.join(self._HOURLY_FIELDS[key] for key in fields),
                 'timezone': 'auto',
-                'forecast_days': min(7, max(1, hours // 24 + 1))
+                'forecast_days': _forecast_days(hours, max_days=7, now=now)
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            forecast_data = []
-            current_time = datetime.now()
-            
-            for i, time_str in enumerate(data['hourly']['time']):
-                forecast_time = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
-                
-                # Only include future forecasts within the requested hours
-                if (forecast_time - current_time).total_seconds() <= hours * 3600:
-                    forecast_data.append({
-                        'time': forecast_time.strftime('%Y-%m-%d %H:%M'),
-                        'temperature': round(data['hourly']['temperature_2m'][i]),
-                        'feels_like': round(data['hourly']['apparent_temperature'][i]),
-                        'humidity': data['hourly']['relative_humidity_2m'][i],
-                        'description': self._weather_code_to_description(data['hourly']['weather_code'][i]),
-                        'wind_speed': data['hourly']['wind_speed_10m'][i],
-                        'precipitation': data['hourly']['precipitation'][i]
-                    })
+            data = self._get_json(url, params)
             
             return {
                 'location': location,
-                'forecast': forecast_data
+                'current': self._parse_current(location, data['current']),
+                **self._parse_hourly(data['hourly'], hours, fields, now)
             }
             
         except Exception as e:
             logger.error(f"Error fetching forecast: {e}")
             return {'error': f"Failed to fetch forecast data: {str(e)}"}
     
+    def _parse_hourly(self, hourly: Dict, hours: int, fields: Tuple[str, ...], now: datetime) -> Dict:
+        """
+        Convert an Open-Meteo 'hourly' block into forecast entries covering the next hours.
+        
+        Returns:
+            Dictionary with the entries under 'forecast' and the time of the first one under 'start_time'
+        """
+        times = hourly['time']
+        if not times:
+            return {'start_time': None, 'forecast': []}
+        
+        # Hours are evenly spaced, so only the first timestamp needs parsing
+        start_time = datetime.fromisoformat(times[0])
+        end = _window_end(start_time, len(times), hours, now)
+        
+        describe = self._WMO_CODES.get
+        convert = {
+            'temperature': round,
+            'feels_like': round,
+            'description': lambda code: describe(code, "unknown"),
+        }
+        
+        # Build one column per requested field, then zip them into per-hour entries
+        keys = ['time'] + [key for key in _FORECAST_FIELDS if key in fields]
+        columns = [[time_str.replace('T', ' ') for time_str in times[:end]]]
+        for key in keys[1:]:
+            column = hourly[self._HOURLY_FIELDS[key]][:end]
+            if key in convert:
+                column = list(map(convert[key], column))
+            columns.append(column)
+        
+        forecast_data = [dict(zip(keys, row)) for row in zip(*columns)]
+        return {'start_time': start_time, 'forecast': forecast_data}
+    
     def _weather_code_to_description(self, code: int) -> str:
         """Convert WMO weather codes to descriptions."""
-        weather_codes = {
-            0: "clear sky",
-            1: "mainly clear",
-            2: "partly cloudy",
-            3: "overcast",
-            45: "foggy",
-            48: "depositing rime fog",
-            51: "light drizzle",
-            53: "moderate drizzle",
-            55: "dense drizzle",
-            56: "light freezing drizzle",
-            57: "dense freezing drizzle",
-            61: "slight rain",
-            63: "moderate rain",
-            65: "heavy rain",
-            66: "light freezing rain",
-            67: "heavy freezing rain",
-            71: "slight snow fall",
-            73: "moderate snow fall",
-            75: "heavy snow fall",
-            77: "snow grains",
-            80: "slight rain showers",
-            81: "moderate rain showers",
-            82: "violent rain showers",
-            85: "slight snow showers",
-            86: "heavy snow showers",
-            95: "thunderstorm",
-            96: "thunderstorm with slight hail",
-            99: "thunderstorm with heavy hail"
-        }
-        return weather_codes.get(code, "unknown")
+        return self._WMO_CODES.get(code, "unknown")
 
 class WeatherAPIProvider(WeatherProvider):
     """WeatherAPI.com provider (1M free calls/month)."""
     
     def __init__(self, api_key: str = None):
+        super().__init__()
         self.api_key = api_key or self._get_api_key()
         self.base_url = "http://api.weatherapi.com/v1"
     
@@ -199,77 +557,119 @@ class WeatherAPIProvider(WeatherProvider):
                 'aqi': 'no'
             }
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            current = data['current']
-            location_data = data['location']
-            
-            return {
-                'location': location_data['name'],
-                'country': location_data['country'],
-                'temperature': round(current['temp_c']),
-                'feels_like': round(current['feelslike_c']),
-                'humidity': current['humidity'],
-                'description': current['condition']['text'],
-                'wind_speed': current['wind_kph'] / 3.6,  # Convert to m/s
-                'pressure': current['pressure_mb'],
-                'visibility': current['vis_km'],
-                'timestamp': current['last_updated']
-            }
+            data = self._get_json(url, params)
+            return self._parse_current(data)
             
         except Exception as e:
             logger.error(f"Error fetching current weather: {e}")
             return {'error': f"Failed to fetch weather data: {str(e)}"}
     
-    def get_forecast(self, location: str, hours: int = 24) -> Dict:
-        """Get weather forecast for a location."""
+    def _parse_current(self, data: Dict) -> Dict:
+        """Convert a WeatherAPI response's 'current' block into a weather dictionary."""
+        current = data['current']
+        location_data = data['location']
+        
+        return {
+            'location': location_data['name'],
+            'country': location_data['country'],
+            'temperature': round(current['temp_c']),
+            'feels_like': round(current['feelslike_c']),
+            'humidity': current['humidity'],
+            'description': current['condition']['text'],
+            'wind_speed': current['wind_kph'] / 3.6,  # Convert to m/s
+            'pressure': current['pressure_mb'],
+            'visibility': current['vis_km'],
+            'timestamp': current['last_updated']
+        }
+    
+    def get_forecast(self, location: str, hours: int = 24, fields: Tuple[str, ...] = _FORECAST_FIELDS) -> Dict:
+        """
+        Get weather forecast for a location.
+        
+        forecast.json has no field selection, so entries always carry every field.
+        """
         try:
-            url = f"{self.base_url}/forecast.json"
-            params = {
-                'key': self.api_key,
-                'q': location,
-                'days': min(3, max(1, hours // 24 + 1)),
-                'aqi': 'no',
-                'alerts': 'no'
-            }
+            now = datetime.now()
+            return self._parse_forecast(self._get_forecast_json(location, hours, now), hours, now)
             
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            forecast_data = []
-            current_time = datetime.now()
-            
-            for day in data['forecast']['forecastday']:
-                for hour in day['hour']:
-                    forecast_time = datetime.fromisoformat(hour['time'])
-                    
-                    # Only include future forecasts within the requested hours
-                    if (forecast_time - current_time).total_seconds() <= hours * 3600:
-                        forecast_data.append({
-                            'time': forecast_time.strftime('%Y-%m-%d %H:%M'),
-                            'temperature': round(hour['temp_c']),
-                            'feels_like': round(hour['feelslike_c']),
-                            'humidity': hour['humidity'],
-                            'description': hour['condition']['text'],
-                            'wind_speed': hour['wind_kph'] / 3.6,  # Convert to m/s
-                            'precipitation': hour['precip_mm']
-                        })
-            
-            return {
-                'location': data['location']['name'],
-                'country': data['location']['country'],
-                'forecast': forecast_data
-            }
+        except Exception as e:
+            logger.error(f"Error fetching forecast: {e}")
+            return {'error': f"Failed to fetch forecast data: {str(e)}"}
+    
+    def get_current_and_forecast(self, location: str, hours: int = 24, fields: Tuple[str, ...] = _FORECAST_FIELDS) -> Dict:
+        """Get current conditions and the hourly forecast; forecast.json already includes 'current'."""
+        try:
+            now = datetime.now()
+            data = self._get_forecast_json(location, hours, now)
+            return {**self._parse_forecast(data, hours, now), 'current': self._parse_current(data)}
             
         except Exception as e:
             logger.error(f"Error fetching forecast: {e}")
             return {'error': f"Failed to fetch forecast data: {str(e)}"}
+    
+    def _get_forecast_json(self, location: str, hours: int, now: datetime) -> Dict:
+        """Fetch the raw forecast.json response covering the next hours."""
+        url = f"{self.base_url}/forecast.json"
+        params = {
+            'key': self.api_key,
+            'q': location,
+            'days': _forecast_days(hours, max_days=3, now=now),
+            'aqi': 'no',
+            'alerts': 'no'
+        }
+        return self._get_json(url, params)
+    
+    def _parse_forecast(self, data: Dict, hours: int, now: datetime) -> Dict:
+        """Convert a forecast.json response into forecast entries covering the next hours."""
+        hourly = [hour for day in data['forecast']['forecastday'] for hour in day['hour']]
+        
+        start_time = None
+        forecast_data = []
+        if hourly:
+            # Hourly entries are evenly spaced: parse only the first timestamp
+            start_time = datetime.fromisoformat(hourly[0]['time'])
+            end = _window_end(start_time, len(hourly), hours, now)
+            forecast_data = [
+                {
+                    'time': hour['time'],
+                    'temperature': round(hour['temp_c']),
+                    'feels_like': round(hour['feelslike_c']),
+                    'humidity': hour['humidity'],
+                    'description': hour['condition']['text'],
+                    'wind_speed': hour['wind_kph'] / 3.6,  # Convert to m/s
+                    'precipitation': hour['precip_mm']
+                }
+                for hour in hourly[:end]
+            ]
+        
+        return {
+            'location': data['location']['name'],
+            'country': data['location']['country'],
+            'start_time': start_time,
+            'forecast': forecast_data
+        }
+
+@dataclass(slots=True)
+class IntensitySample:
+    """Conditions for one rainy forecast hour."""
+    time: datetime
+    description: str
+    precipitation: float
+
+@dataclass(slots=True)
+class RainPeriod:
+    """A run of consecutive rainy forecast hours; end_time is None if it outlasts the forecast."""
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    intensity: List[IntensitySample] = field(default_factory=list)
 
 class WeatherForecast:
+    # Seconds a fetched result stays valid; weather changes over minutes, not seconds
+    CURRENT_TTL = 300
+    FORECAST_TTL = 900
+    # Most entries kept; the least recently used ones are dropped first
+    CACHE_SIZE = 128
+    
     def __init__(self, provider: str = "openmeteo", api_key: str = None):
         """
         Initialize the weather forecast service.
@@ -279,6 +679,9 @@ class WeatherForecast:
             api_key: API key (only needed for some providers)
         """
         self.provider_name = provider.lower()
+        # (provider, method, location, ...) -> (expiry on the monotonic clock, result), oldest first
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
         
         if self.provider_name == "openmeteo":
             self.provider = OpenMeteoProvider()
@@ -290,6 +693,10 @@ class WeatherForecast:
         else:
             raise ValueError(f"Unknown provider: {provider}. Supported: openmeteo, weatherapi, openweathermap")
     
+    def close(self):
+        """Release the provider's HTTP connections."""
+        self.provider.close()
+    
     def _is_weather_query(self, text: str) -> bool:
         """
         Check if the transcription is a weather-related query.
@@ -304,184 +711,108 @@ class WeatherForecast:
             return False
             
         text_lower = text.lower()
+        if any(keyword in text_lower for keyword in _CHEAP_KEYWORDS):
+            return True
         
-        # Weather-related keywords and patterns
-        weather_keywords = [
-            'weather', 'temperature', 'forecast', 'rain', 'snow', 'sunny', 
-            'cloudy', 'hot', 'cold', 'humid', 'wind', 'storm', 'thunder',
-            'drizzle', 'fog', 'mist', 'hail', 'sleet', 'precipitation',
-            'degrees', 'celsius', 'fahrenheit', '°c', '°f'
-        ]
-        
-        # Weather question patterns
-        weather_patterns = [
-            r'\b(what\'?s?|how\'?s?)\s+(the\s+)?weather',
-            r'\b(is\s+it\s+)(raining|snowing|sunny|cloudy|hot|cold)',
-            r'\b(weather\s+)(in|for|at)',
-            r'\b(temperature\s+)(in|for|at)',
-            r'\b(forecast\s+)(for|in)',
-        ]
-        
-        # Rain-specific patterns
-        rain_patterns = [
-            r'\b(when\s+will\s+)(the\s+)?rain\s+(stop|end)',
-            r'\b(how\s+long\s+)(will\s+)?(it\s+)?(keep\s+)?(raining|rain)',
-            r'\b(is\s+it\s+)(still\s+)?(raining|going\s+to\s+rain)',
-            r'\b(when\s+does\s+)(the\s+)?rain\s+(stop|end)',
-            r'\b(rain\s+)(stop|end|continue)',
-        ]
-        
-        # Check for rain-specific patterns first
-        for pattern in rain_patterns:
-            if re.search(pattern, text_lower):
-                return True
-        
-        # Check for weather keywords
-        for keyword in weather_keywords:
-            if keyword in text_lower:
-                return True
-        
-        # Check for weather patterns
-        for pattern in weather_patterns:
-            if re.search(pattern, text_lower):
-                return True
-        
-        return False
+        # One pass over the text covers the remaining keywords and every question pattern
+        return _WEATHER_QUERY_RE.search(text_lower) is not None
     
-    def _is_rain_query(self, text: str) -> bool:
+    def _is_rain_query(self, text_lower: str) -> bool:
         """
         Check if the query is specifically about rain patterns.
         
         Args:
-            text: The transcribed text
+            text_lower: The transcribed text, already lowercased
             
         Returns:
             True if it's a rain-specific query, False otherwise
         """
-        if not text:
+        if not text_lower:
             return False
-            
-        text_lower = text.lower()
-        
-        # Rain-specific keywords and patterns
-        rain_keywords = ['rain', 'raining', 'drizzle', 'shower', 'precipitation']
-        rain_patterns = [
-            r'\b(when\s+will\s+)(the\s+)?rain\s+(stop|end)',
-            r'\b(how\s+long\s+)(will\s+)?(it\s+)?(keep\s+)?(raining|rain)',
-            r'\b(is\s+it\s+)(still\s+)?(raining|going\s+to\s+rain)',
-            r'\b(when\s+does\s+)(the\s+)?rain\s+(stop|end)',
-            r'\b(rain\s+)(stop|end|continue)',
-            r'\b(will\s+)(it\s+)?(stop\s+)?(raining|rain)',
-            r'\b(how\s+much\s+)(longer\s+)?(will\s+)?(it\s+)?(rain|raining)',
-        ]
         
-        # Check for rain keywords
-        for keyword in rain_keywords:
-            if keyword in text_lower:
-                # Additional check to ensure it's about rain timing, not just general weather
-                if any(word in text_lower for word in ['when', 'how long', 'stop', 'end', 'continue', 'still']):
-                    return True
+        # A rain keyword plus a word about timing, not just general weather
+        if _RAIN_KEYWORDS_RE.search(text_lower) and _RAIN_TIMING_WORDS_RE.search(text_lower):
+            return True
         
         # Check for rain patterns
-        for pattern in rain_patterns:
-            if re.search(pattern, text_lower):
-                return True
-        
-        return False
+        return _RAIN_TIMING_RE.search(text_lower) is not None
     
-    def _parse_time_reference(self, text: str) -> Tuple[str, Optional[str]]:
+    def _parse_time_reference(self, text_lower: str) -> Tuple[str, Optional[str]]:
         """
         Parse time references from natural language text.
         
         Args:
-            text: Natural language text containing time references
+            text_lower: Lowercased natural language text containing time references
             
         Returns:
             Tuple of (time_reference, time_period)
         """
-        text_lower = text.lower()
-        
-        # Time periods
-        time_periods = {
-            'now': 'current',
-            'today': 'current',
-            'tonight': 'current',
-            'this evening': 'current',
-            'this afternoon': 'current',
-            'this morning': 'current',
-            'evening': 'evening',
-            'afternoon': 'afternoon',
-            'morning': 'morning',
-            'night': 'night',
-            'tonight': 'night',
-            'tomorrow': 'tomorrow',
-            'tomorrow morning': 'tomorrow_morning',
-            'tomorrow afternoon': 'tomorrow_afternoon',
-            'tomorrow evening': 'tomorrow_evening',
-            'tomorrow night': 'tomorrow_night',
-            'next hour': 'next_hour',
-            'in an hour': 'next_hour',
-            'in 1 hour': 'next_hour',
-            'in 2 hours': 'next_2_hours',
-            'in 3 hours': 'next_3_hours',
-            'in 4 hours': 'next_4_hours',
-            'in 5 hours': 'next_5_hours',
-        }
-        
-        # Find time reference
-        time_reference = 'current'  # default
-        time_period = None
+        matches = _TIME_PERIOD_RE.findall(text_lower)
+        if matches:
+            # Several phrases mentioned: keep the table's precedence, not their position in the text
+            time_period = min(matches, key=_TIME_PERIOD_PRIORITY.__getitem__)
+            return _TIME_PERIODS[time_period], time_period
         
-        for period, reference in time_periods.items():
-            if period in text_lower:
-                time_reference = reference
-                time_period = period
-                break
-                
-        return time_reference, time_period
+        return 'current', None
     
-    def _extract_location(self, text: str) -> str:
+    def _extract_location(self, text_lower: str) -> str:
         """
         Simple location extraction focused on Berlin and major cities.
         """
-        text_lower = text.lower()
-        
-        # Check for Berlin first (most common case)
-        if 'berlin' in text_lower:
-            return "Berlin"
-        
-        # Check for other major German cities
-        german_cities = ['munich', 'hamburg', 'cologne', 'frankfurt', 'stuttgart', 
-                        'düsseldorf', 'dortmund', 'leipzig', 'bremen', 'dresden']
-        
-        for city in german_cities:
-            if city in text_lower:
-                return city.title()
-        
-        # Check for international cities
-        international_cities = ['london', 'paris', 'new york', 'tokyo', 'sydney']
-        for city in international_cities:
-            if city in text_lower:
-                return city.title()
+        matches = _CITY_RE.findall(text_lower)
+        if matches:
+            # Several cities mentioned: keep the original precedence (Berlin first)
+            return min(matches, key=_CITY_PRIORITY.__getitem__).title()
         
         # If no specific city mentioned, default to Berlin
         return "Berlin"
     
+    def _cached(self, key: tuple, ttl: float, fetch: Callable[[], Dict]) -> Dict:
+        """
+        Return a cached result for key, calling fetch when it is missing or expired.
+        
+        Error results are returned but never cached, so the next call retries.
+        """
+        key = (self.provider_name,) + key
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and now < entry[0]:
+                self._cache.move_to_end(key)
+                return entry[1]
+        
+        result = fetch()
+        if 'error' not in result:
+            with self._cache_lock:
+                self._cache[key] = (now + ttl, result)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return result
+    
     def get_current_weather(self, location: str) -> Dict:
         """Get current weather for a location."""
-        return self.provider.get_current_weather(location)
+        key = ('current', location.strip().lower())
+        return self._cached(key, self.CURRENT_TTL, lambda: self.provider.get_current_weather(location))
     
-    def get_forecast(self, location: str, hours: int = 24) -> Dict:
-        """Get weather forecast for a location."""
-        return self.provider.get_forecast(location, hours)
+    def get_forecast(self, location: str, hours: int = 24, fields: Tuple[str, ...] = _FORECAST_FIELDS) -> Dict:
+        """Get weather forecast for a location, limited to the given entry fields."""
+        key = ('forecast', location.strip().lower(), hours, fields)
+        return self._cached(key, self.FORECAST_TTL, lambda: self.provider.get_forecast(location, hours, fields))
     
-    def get_weather_for_time(self, location: str, time_reference: str) -> Dict:
+    def get_current_and_forecast(self, location: str, hours: int = 24, fields: Tuple[str, ...] = _FORECAST_FIELDS) -> Dict:
+        """Get current conditions (under 'current') together with the hourly forecast."""
+        key = ('current_and_forecast', location.strip().lower(), hours, fields)
+        return self._cached(key, self.CURRENT_TTL, lambda: self.provider.get_current_and_forecast(location, hours, fields))
+    
+    def get_weather_for_time(self, location: str, time_reference: str, now: Optional[datetime] = None) -> Dict:
         """
         Get weather for a specific time reference.
         
         Args:
             location: City name or coordinates
             time_reference: Time reference (current, evening, tomorrow, etc.)
+            now: Time the query was made (defaults to the current time)
             
         Returns:
             Dictionary containing weather information
@@ -495,52 +826,31 @@ class WeatherForecast:
         if 'error' in forecast_data:
             return forecast_data
         
-        current_time = datetime.now()
+        current_time = now or datetime.now()
         target_time = None
         
-        if time_reference == 'evening':
-            # Evening is typically 6 PM to 9 PM
-            target_time = current_time.replace(hour=18, minute=0, second=0, microsecond=0)
-        elif time_reference == 'afternoon':
-            # Afternoon is typically 2 PM to 5 PM
-            target_time = current_time.replace(hour=14, minute=0, second=0, microsecond=0)
-        elif time_reference == 'morning':
-            # Morning is typically 8 AM to 11 AM
-            target_time = current_time.replace(hour=9, minute=0, second=0, microsecond=0)
-        elif time_reference == 'night':
-            # Night is typically 10 PM to 6 AM
-            target_time = current_time.replace(hour=22, minute=0, second=0, microsecond=0)
-        elif time_reference == 'tomorrow':
-            # Tomorrow at current time
-            target_time = current_time + timedelta(days=1)
-        elif time_reference.startswith('tomorrow_'):
-            # Tomorrow at specific time
-            tomorrow = current_time + timedelta(days=1)
-            if 'morning' in time_reference:
-                target_time = tomorrow.replace(hour=9, minute=0, second=0, microsecond=0)
-            elif 'afternoon' in time_reference:
-                target_time = tomorrow.replace(hour=14, minute=0, second=0, microsecond=0)
-            elif 'evening' in time_reference:
-                target_time = tomorrow.replace(hour=18, minute=0, second=0, microsecond=0)
-            elif 'night' in time_reference:
-                target_time = tomorrow.replace(hour=22, minute=0, second=0, microsecond=0)
-        elif time_reference.startswith('next_'):
-            # Next few hours
-            hours_ahead = int(time_reference.split('_')[-1]) if time_reference.split('_')[-1].isdigit() else 1
-            target_time = current_time + timedelta(hours=hours_ahead)
+        if time_reference in _TIME_REFERENCE_TARGETS:
+            days_ahead, hour = _TIME_REFERENCE_TARGETS[time_reference]
+            target_time = current_time + timedelta(days=days_ahead)
+            if hour is not None:
+                target_time = target_time.replace(hour=hour, minute=0, second=0, microsecond=0)
+        else:
+            match = _NEXT_HOURS_RE.fullmatch(time_reference)
+            if match:
+                # Next few hours ('next_hour' is one hour ahead)
+                hours_ahead = int(match.group(1) or 1)
+                target_time = current_time + timedelta(hours=hours_ahead)
         
         if target_time:
-            # Find the closest forecast entry to target time
+            # Forecast entries are hourly, so the closest one is a direct index
+            # (ties resolve to the earlier hour)
             closest_forecast = None
-            min_diff = float('inf')
+            forecasts = forecast_data['forecast']
             
-            for forecast in forecast_data['forecast']:
-                forecast_time = datetime.strptime(forecast['time'], '%Y-%m-%d %H:%M')
-                diff = abs((forecast_time - target_time).total_seconds())
-                
-                if diff < min_diff:
-                    min_diff = diff
-                    closest_forecast = forecast
+            if forecasts:
+                offset_hours = (target_time - forecast_data['start_time']).total_seconds() / 3600
+                index = max(0, min(len(forecasts) - 1, math.ceil(offset_hours - 0.5)))
+                closest_forecast = forecasts[index]
             
             if closest_forecast:
                 return {
@@ -593,53 +903,74 @@ class WeatherForecast:
         Returns:
             Formatted weather response
         """
+        # Lowercase once; every helper below works on the lowered text
+        query_lower = query.lower()
+        # One clock reading for the whole query, so every step agrees on "now"
+        now = datetime.now()
         
         # Extract location and time reference
-        location = self._extract_location(query)
+        location = self._extract_location(query_lower)
 
         # Check if this is a rain-specific query
-        if self._is_rain_query(query):
-            return self.process_rain_query(query, location)
+        if self._is_rain_query(query_lower):
+            return self.process_rain_query(query, location, now)
 
-        time_reference, time_period = self._parse_time_reference(query)
+        time_reference, time_period = self._parse_time_reference(query_lower)
         
         logger.info(f"Processing weather query: location={location}, time={time_reference}")
         
         # Get weather data
-        weather_data = self.get_weather_for_time(location, time_reference)
+        weather_data = self.get_weather_for_time(location, time_reference, now)
         
         # Format response
         return self.format_weather_response(weather_data, time_period)
+    
+    def process_weather_queries(self, queries: List[str]) -> List[str]:
+        """
+        Process several natural language weather queries concurrently.
+        
+        Args:
+            queries: Natural language weather queries
+            
+        Returns:
+            Formatted weather responses, in the same order as queries
+        """
+        if not queries:
+            return []
+        
+        # Each query is dominated by HTTP latency, so overlap them on threads
+        with ThreadPoolExecutor(max_workers=min(8, len(queries)), thread_name_prefix="weather") as pool:
+            return list(pool.map(self.process_weather_query, queries))
 
-    def _analyze_rain_pattern(self, location: str) -> Dict:
+    def _analyze_rain_pattern(self, location: str, now: Optional[datetime] = None) -> Dict:
         """
         Analyze rain pattern to determine when rain will stop or how long it will continue.
         
         Args:
             location: City name or coordinates
+            now: Time the query was made (defaults to the current time)
             
         Returns:
             Dictionary containing rain analysis information
         """
         try:
-            # Get detailed forecast for next 24 hours (hourly data)
-            forecast_data = self.get_forecast(location, hours=24)
+            # Current conditions and the 24 h hourly forecast come from one request
+            forecast_data = self.get_current_and_forecast(location, hours=24, fields=_RAIN_FIELDS)
             
             if 'error' in forecast_data:
                 return forecast_data
             
-            current_time = datetime.now()
+            current_time = now or datetime.now()
             rain_analysis = {
                 'is_currently_raining': False,
                 'rain_start_time': None,
                 'rain_end_time': None,
-                'rain_duration': None,
                 'rain_intensity': [],
                 'next_rain_periods': []
             }
             
             # Check if it's currently raining
-            current_weather = self.get_current_weather(location)
+            current_weather = forecast_data['current']
             if 'error' not in current_weather:
                 current_desc = current_weather.get('description', '').lower()
                 current_precip = current_weather.get('precipitation', 0)
@@ -653,7 +984,7 @@ class WeatherForecast:
             current_rain_period = None
             
             for forecast in forecast_data['forecast']:
-                forecast_time = datetime.strptime(forecast['time'], '%Y-%m-%d %H:%M')
+                forecast_time = datetime.fromisoformat(forecast['time'])
                 description = forecast.get('description', '').lower()
                 precipitation = forecast.get('precipitation', 0)
                 
@@ -665,41 +996,29 @@ class WeatherForecast:
                 if is_raining:
                     if current_rain_period is None:
                         # Start of new rain period
-                        current_rain_period = {
-                            'start_time': forecast_time,
-                            'intensity': []
-                        }
-                    current_rain_period['intensity'].append({
-                        'time': forecast_time,
-                        'description': description,
-                        'precipitation': precipitation
-                    })
+                        current_rain_period = RainPeriod(start_time=forecast_time)
+                    current_rain_period.intensity.append(
+                        IntensitySample(forecast_time, description, precipitation)
+                    )
                 else:
                     if current_rain_period is not None:
                         # End of rain period
-                        current_rain_period['end_time'] = forecast_time
-                        current_rain_period['duration'] = (
-                            current_rain_period['end_time'] - current_rain_period['start_time']
-                        ).total_seconds() / 3600  # Duration in hours
+                        current_rain_period.end_time = forecast_time
                         rain_periods.append(current_rain_period)
                         current_rain_period = None
             
-            # Handle case where rain period extends beyond forecast
+            # Handle case where rain period extends beyond forecast (end_time stays None)
             if current_rain_period is not None:
-                current_rain_period['end_time'] = None
-                current_rain_period['duration'] = None
                 rain_periods.append(current_rain_period)
             
             # Find current/next rain period
             for period in rain_periods:
-                if period['start_time'] <= current_time:
-                    if period['end_time'] is None or period['end_time'] > current_time:
+                if period.start_time <= current_time:
+                    if period.end_time is None or period.end_time > current_time:
                         # Currently raining
-                        rain_analysis['rain_start_time'] = period['start_time']
-                        rain_analysis['rain_end_time'] = period['end_time']
-                        if period['end_time']:
-                            rain_analysis['rain_duration'] = period['duration']
-                        rain_analysis['rain_intensity'] = period['intensity']
+                        rain_analysis['rain_start_time'] = period.start_time
+                        rain_analysis['rain_end_time'] = period.end_time
+                        rain_analysis['rain_intensity'] = period.intensity
                         break
                 else:
                     # Future rain period
@@ -727,7 +1046,7 @@ class WeatherForecast:
         if not rain_analysis['is_currently_raining']:
             if rain_analysis['next_rain_periods']:
                 next_rain = rain_analysis['next_rain_periods'][0]
-                start_time = next_rain['start_time'].strftime('%H:%M')
+                start_time = next_rain.start_time.strftime('%H:%M')
                 return f"It's not currently raining. The next rain is expected to start around {start_time}."
             else:
                 return "It's not currently raining and no significant rain is expected in the next 24 hours."
@@ -737,36 +1056,31 @@ class WeatherForecast:
         
         if rain_analysis['rain_end_time']:
             # We know when it will stop
-            end_time = rain_analysis['rain_end_time'].strftime('%H:%M').replace(':00', " o'clock").replace(':30', ' thirty').replace(':15', ' quarter past').replace(':45', ' quarter to')
-            duration = rain_analysis['rain_duration']
-            
-            if duration:
-                if duration < 1:
-                    response += f"The rain should stop around {end_time}."
-                elif duration < 2:
-                    response += f"The rain should stop around {end_time}."
-                else:
-                    response += f"The rain should stop around {end_time}."
-            else:
-                response += f"The rain should stop around {end_time}."
+            hour, minute = rain_analysis['rain_end_time'].strftime('%H:%M').split(':')
+            end_time = hour + _MINUTE_WORDS.get(minute, ':' + minute)
+            response += f"The rain should stop around {end_time}."
         else:
             # Rain extends beyond our forecast
             response += "The rain is expected to continue for several more hours."
         
         # Add intensity information if available
-        if rain_analysis['rain_intensity']:
-            intensities = [entry['description'] for entry in rain_analysis['rain_intensity']]
-            if len(set(intensities)) > 1:
-                response += f" The intensity varies from {intensities[0]} to {intensities[-1]}."
+        intensity = rain_analysis['rain_intensity']
+        if intensity:
+            # Stops at the first hour that differs instead of collecting every description
+            first = intensity[0].description
+            if any(sample.description != first for sample in intensity):
+                response += f" The intensity varies from {first} to {intensity[-1].description}."
         
         return response
     
-    def process_rain_query(self, query: str, location: str = None) -> str:
+    def process_rain_query(self, query: str, location: str = None, now: Optional[datetime] = None) -> str:
         """
         Process a natural language rain-related query.
         
         Args:
             query: Natural language rain query
+            location: City name or coordinates
+            now: Time the query was made (defaults to the current time)
             
         Returns:
             Formatted rain analysis response
@@ -774,7 +1088,7 @@ class WeatherForecast:
         logger.info(f"Processing rain query: location={location}")
         
         # Analyze rain pattern
-        rain_analysis = self._analyze_rain_pattern(location)
+        rain_analysis = self._analyze_rain_pattern(location, now)
         
         # Format response
         return self._format_rain_analysis(rain_analysis)
@@ -1,21 +1,30 @@
 import json
 import logging
+import time
+import orjson
 import hydra
 from omegaconf import DictConfig, OmegaConf
 
-from gradio.utils import get_space
-from fastrtc import Stream, ReplyOnPause, ReplyOnStopWords, AlgoOptions, SileroVadOptions
-from fastrtc import get_twilio_turn_credentials
-from voice_assistant.model import VoiceAssistant
 from voice_assistant.logger import setup_logging
-
-import uvicorn
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, StreamingResponse
 from importlib.resources import files
 
+# How long a rendered page (and the TURN credentials in it) is served before fetching new ones
+TURN_CREDENTIALS_REFRESH_S = 3600
+
 @hydra.main(config_path="cli/conf", config_name="base")
 def main(cfg: DictConfig):
+    # The web/audio stack (and through it torch and onnxruntime) is only imported
+    # once Hydra has parsed the command line, so `--help` and plain imports stay fast
+    from gradio.utils import get_space
+    from fastrtc import Stream, AlgoOptions, SileroVadOptions
+    from fastrtc import get_twilio_turn_credentials
+    from voice_assistant.model import VoiceAssistant
+    from voice_assistant.vad import EnergyGatedVAD, GatedReplyOnPause, GatedReplyOnStopWords
+
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import HTMLResponse, StreamingResponse
+
     setup_logging()
     logger = logging.getLogger(__name__)
     logger.info(f"Config: {OmegaConf.to_yaml(cfg)}")
@@ -23,8 +32,18 @@ def main(cfg: DictConfig):
     # Initialize models
     assistant = VoiceAssistant(cfg)
 
+    # Quiet chunks never reach the Silero model. The gate tracks the room's noise floor,
+    # so each handler gets its own and every connection copies it (see GatedReplyOnPause)
+    def energy_gate():
+        if not cfg.stream.energy_gate.enabled:
+            return None
+        return EnergyGatedVAD(
+            margin_db=cfg.stream.energy_gate.margin_db,
+            noise_floor_decay=cfg.stream.energy_gate.noise_floor_decay,
+        )
+
     # Create the pause-based handler for normal conversation
-    pause_handler = ReplyOnPause(
+    pause_handler = GatedReplyOnPause(
         assistant.speech_to_speech,
         algo_options=AlgoOptions(
             audio_chunk_duration=cfg.stream.algo_options.audio_chunk_duration,
@@ -40,6 +59,7 @@ def main(cfg: DictConfig):
             speech_pad_ms=cfg.stream.model_options.speech_pad_ms,
         ),
         can_interrupt=cfg.stream.can_interrupt,
+        model=energy_gate(),
     )
 
     # Create the stop word handler for wake word detection
@@ -49,7 +69,7 @@ def main(cfg: DictConfig):
         # Process the audio with the pause handler
         return assistant.speech_to_speech(audio)
 
-    stop_word_handler = ReplyOnStopWords(
+    stop_word_handler = GatedReplyOnStopWords(
         on_wake_word_detected,
         stop_words=[cfg.stream.wake_word],  # Add your desired wake words here
         input_sample_rate=16000,  # Required for stop word detection
@@ -67,6 +87,7 @@ def main(cfg: DictConfig):
             speech_pad_ms=cfg.stream.model_options.speech_pad_ms,
         ),
         can_interrupt=cfg.stream.can_interrupt,
+        model=energy_gate(),
     )
 
     # Create the stream with the stop word handler initially
@@ -82,24 +103,37 @@ def main(cfg: DictConfig):
 
     stream.mount(app)
 
+    # The page is static apart from the RTC configuration. TURN credentials expire
+    # (Twilio tokens after 24 h), so the rendered page is only reused for a while
+    html_template = files('voice_assistant').joinpath('index.html').read_text()
+    page = {"html": None, "expires": 0.0}
+
+    def render_page() -> str:
+        now = time.monotonic()
+        if page["html"] is None or now >= page["expires"]:
+            rtc_config = get_twilio_turn_credentials() if get_space() else None
+            page["html"] = html_template.replace("__RTC_CONFIGURATION__", json.dumps(rtc_config))
+            page["expires"] = now + TURN_CREDENTIALS_REFRESH_S if rtc_config else float("inf")
+        return page["html"]
+
     @app.get("/")
-    async def _():
-        rtc_config = get_twilio_turn_credentials() if get_space() else None
-        html_content = files('voice_assistant').joinpath('index.html').read_text()
-        html_content = html_content.replace("__RTC_CONFIGURATION__", json.dumps(rtc_config))
-        return HTMLResponse(content=html_content)
+    def _():
+        # Sync route: fetching fresh credentials is a blocking call, so it runs in the threadpool
+        return HTMLResponse(content=render_page())
 
     @app.get("/outputs")
     def _(webrtc_id: str):
         async def output_stream():
-            import json
-
+            dumps = orjson.dumps
             async for output in stream.output_stream(webrtc_id):
-                s = json.dumps(output.args[0])
+                s = dumps(output.args[0], option=orjson.OPT_SERIALIZE_NUMPY).decode()
                 yield f"event: output\ndata: {s}\n\n"
 
         return StreamingResponse(output_stream(), media_type="text/event-stream")
     
-    uvicorn.run(app, port=cfg.stream.port)
+    try:
+        uvicorn.run(app, port=cfg.stream.port)
+    finally:
+        assistant.close()
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,23 +1,71 @@
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
 import numpy as np
 from omegaconf import DictConfig
 from pathlib import Path
+from typing import Callable, Iterator, Optional
 import hydra
 
 from fastrtc import get_stt_model, get_tts_model, KokoroTTSOptions, AdditionalOutputs
 from fastrtc_whisper_cpp import get_stt_model as get_stt_model_whisper_cpp
-from llama_cpp import Llama
+import llama_cpp
+from llama_cpp import Llama, llama_supports_gpu_offload
+from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
 
-from voice_assistant.util import timer
+from voice_assistant.util import timer, record_timing
+from voice_assistant.vad import rms
 from voice_assistant.features.weather import WeatherForecast
 from voice_assistant.features.memory import ConversationMemory
 
+# Every prompt starts with this exact text. llama.cpp keeps the KV cache of the
+# previous prompt and only evaluates the tokens after the longest shared prefix,
+# so this opening is never re-prefilled. The history after it is only reused while
+# the memory window is still filling; once the oldest turn is dropped the prompt
+# diverges right after the opening.
+SYSTEM_PROMPT = "<|system|>\nYou are a helpful assistant."
+
+# KV cache element types selectable from the config
+KV_CACHE_TYPES = {
+    "f16": llama_cpp.GGML_TYPE_F16,
+    "q8_0": llama_cpp.GGML_TYPE_Q8_0,
+    "q4_0": llama_cpp.GGML_TYPE_Q4_0,
+}
+
+# A transcription needs at least one word character to be worth answering
+NON_EMPTY = re.compile(r"\w")
+# Whisper's usual output for silence or noise
+STT_HALLUCINATION = re.compile(r"\s*(?:\[BLANK_AUDIO\]|\(?silence\)?|thank you\.?|thanks for watching!?)\s*", re.IGNORECASE)
+
+# End of a sentence in streamed LLM text: punctuation followed by whitespace
+SENTENCE_END = re.compile(r'[.!?]\s')
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on (respects taskset/cgroup affinity)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS/Windows
+        return os.cpu_count() or 1
+
 class STT:
-    def __init__(self, model: str = "moonshine/base"):
-        #self.stt_model = get_stt_model(model=stt_model)
-        self.stt_model = get_stt_model_whisper_cpp(model=model)
+    def __init__(self, model: str = "moonshine/base", backend: str = "whisper_cpp", min_rms: float = 0.003):
+        if backend == "whisper_cpp":
+            self.stt_model = get_stt_model_whisper_cpp(model=model)
+        elif backend == "onnx":
+            # fastrtc's Moonshine models run through onnxruntime on the CPU
+            self.stt_model = get_stt_model(model=model)
+        else:
+            raise ValueError(f"Unknown STT backend: {backend}. Supported: whisper_cpp, onnx")
+        self.min_rms = min_rms
 
     @timer
     def speech_to_text(self, audio: tuple[int, np.ndarray]):
+        # Near-silent segments only produce hallucinations; skip the encoder for them
+        if rms(audio[1]) < self.min_rms:
+            return ""
         return self.stt_model.stt(audio)
 
 class TTS:
@@ -25,32 +73,119 @@ class TTS:
                  voice: str = "af_heart", 
                  speed: float = 1.0, 
                  lang: str = "en-us",
+                 stream: bool = True,
+                 cache_size: int = 128,
                  ):
         self.tts_model = get_tts_model(model=model)
         self.options = KokoroTTSOptions(voice=voice, speed=speed, lang=lang)
+        self.stream = stream
+        # LRU of synthesized clips for sentences that come up again (greetings, error replies, ...)
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _cache_key(self, text: str) -> tuple:
+        return (text, self.options.voice, self.options.speed, self.options.lang)
+
+    def _cache_get(self, key: tuple) -> Optional[tuple[int, np.ndarray]]:
+        with self._cache_lock:
+            audio = self._cache.get(key)
+            if audio is not None:
+                self._cache.move_to_end(key)
+            return audio
+
+    def _cache_put(self, key: tuple, audio: tuple[int, np.ndarray]):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = audio
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
 
     @timer
     def text_to_speech(self, text: str):
-        return self.tts_model.tts(text, options=self.options)
+        key = self._cache_key(text)
+        audio = self._cache_get(key)
+        if audio is None:
+            audio = self.tts_model.tts(text, options=self.options)
+            self._cache_put(key, audio)
+        return audio
+
+    @timer
+    def text_to_speech_stream(self, text: str) -> Iterator[tuple[int, np.ndarray]]:
+        """Yield audio chunks as they are synthesized, so playback can start before the whole text is done"""
+        if not self.stream:
+            yield self.text_to_speech(text)
+            return
+        
+        key = self._cache_key(text)
+        audio = self._cache_get(key)
+        if audio is not None:
+            yield audio
+            return
+        
+        chunks = []
+        for chunk in self.tts_model.stream_tts_sync(text, options=self.options):
+            chunks.append(chunk)
+            yield chunk
+        # Only cache clips that were synthesized to the end (not interrupted)
+        if chunks:
+            self._cache_put(key, (chunks[0][0], np.concatenate([c[1] for c in chunks], axis=-1)))
 
 class LLM:
     def __init__(self, model_path: str, 
                         n_ctx: int, 
                         max_conversations: int = 10, 
-                        memory_file: str = "./data/conversation_memory.json", 
+                        memory_file: str = "./data/conversation_memory.jsonl", 
                         temperature: float = 0.2, 
                         top_p: float = 0.9, 
                         repeat_penalty: float = 1.2, 
                         max_tokens: int = 50, 
-                        echo: bool = False):
+                        echo: bool = False,
+                        n_gpu_layers: int = -1,
+                        flash_attn: bool = True,
+                        use_mmap: bool = True,
+                        kv_cache_type: str = "q8_0",
+                        n_threads: Optional[int] = None,
+                        n_threads_batch: Optional[int] = None,
+                        n_batch: int = 512,
+                        n_ubatch: int = 512,
+                        draft_tokens: int = 0):
         project_root = Path(__file__).parents[0]  # Go up to project root
         model_path = str((project_root / model_path).resolve())
         
+        # -1 offloads every layer; fall back to CPU when llama.cpp has no CUDA/Metal backend
+        if not llama_supports_gpu_offload():
+            n_gpu_layers = 0
+        
+        # Decoding is bound by KV cache reads; q8_0 halves them versus f16.
+        # llama.cpp can only quantize the V cache when flash attention is on.
+        type_k = KV_CACHE_TYPES[kv_cache_type]
+        type_v = type_k if flash_attn else llama_cpp.GGML_TYPE_F16
+        
+        # Default to every CPU the process is allowed to use instead of a fixed count
+        n_threads = n_threads or available_cpus()
+        n_threads_batch = n_threads_batch or n_threads
+        
+        # Speculative decoding without a second model: draft tokens are looked up
+        # from n-grams already in the prompt and verified in one batched forward pass
+        draft_model = LlamaPromptLookupDecoding(num_pred_tokens=draft_tokens) if draft_tokens > 0 else None
+        
         self.llm = Llama(model_path=model_path, 
                          n_ctx=n_ctx,
-                         n_threads=16,
-                         n_batch=16,
-                         n_gpu_layers=0)
+                         n_threads=n_threads,
+                         n_threads_batch=n_threads_batch,
+                         n_batch=n_batch,
+                         n_ubatch=n_ubatch,
+                         n_gpu_layers=n_gpu_layers,
+                         offload_kqv=n_gpu_layers != 0,
+                         flash_attn=flash_attn,
+                         use_mmap=use_mmap,
+                         use_mlock=False,
+                         type_k=type_k,
+                         type_v=type_v,
+                         draft_model=draft_model)
         self.memory = ConversationMemory(max_conversations=max_conversations, save_file=memory_file)
         self.temperature = temperature
         self.top_p = top_p
@@ -58,35 +193,61 @@ class LLM:
         self.max_tokens = max_tokens
         self.stop = ["Q:", "\n", "<|end|>"]
         self.echo = echo
+        # One Llama context is shared by every session; llama.cpp contexts are not thread-safe
+        self._lock = threading.Lock()
         
-    @timer
-    def generate(self, prompt: str):
+        # Evaluate the fixed prompt opening now; every generate call then matches it
+        # as the cached prefix and only prefills the history and the user turn
+        self.llm.eval(self.llm.tokenize(SYSTEM_PROMPT.encode("utf-8")))
+        
+    def _build_prompt(self, prompt: str) -> str:
         # Get conversation history context
         context = self.memory.get_context()
         
         # Build the complete prompt with memory context
         if context:
             text_prompt = (
-                f"<|system|>\nYou are a helpful assistant. Here is the conversation history:\n{context}\n<|end|>\n"
+                f"{SYSTEM_PROMPT} Here is the conversation history:\n{context}\n<|end|>\n"
                 f"<|user|>\n{prompt}\n<|end|>\n"
                 f"<|assistant|>\n"
             )
         else:
             text_prompt = (
-                f"<|system|>\nYou are a helpful assistant.<|end|>\n"
+                f"{SYSTEM_PROMPT}<|end|>\n"
                 f"<|user|>\n{prompt}\n<|end|>\n"
                 f"<|assistant|>\n"
             )
-
-        response = self.llm(text_prompt, 
-                            temperature=self.temperature, 
-                            top_p=self.top_p, 
-                            repeat_penalty=self.repeat_penalty, 
-                            max_tokens=self.max_tokens,
-                            stop=self.stop,
-                            echo=self.echo)
+        return text_prompt
+    
+    @timer
+    def generate(self, prompt: str):
+        text_prompt = self._build_prompt(prompt)
+        with self._lock:
+            response = self.llm(text_prompt, 
+                                temperature=self.temperature, 
+                                top_p=self.top_p, 
+                                repeat_penalty=self.repeat_penalty, 
+                                max_tokens=self.max_tokens,
+                                stop=self.stop,
+                                echo=self.echo)
         return response["choices"][0]["text"].strip()
     
+    @timer
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """Yield the response text piece by piece as the model decodes it"""
+        text_prompt = self._build_prompt(prompt)
+        # Held until the stream finishes or is closed
+        with self._lock:
+            for chunk in self.llm(text_prompt, 
+                                  temperature=self.temperature, 
+                                  top_p=self.top_p, 
+                                  repeat_penalty=self.repeat_penalty, 
+                                  max_tokens=self.max_tokens,
+                                  stop=self.stop,
+                                  echo=self.echo,
+                                  stream=True):
+                yield chunk["choices"][0]["text"]
+    
     def add_to_memory(self, user_message: str, assistant_response: str):
         """Add conversation to memory"""
         self.memory.add_conversation(user_message, assistant_response)
@@ -94,6 +255,10 @@ class LLM:
     def get_memory_info(self) -> dict:
         """Get information about the conversation memory"""
         return self.memory.get_memory_info()
+    
+    def close(self):
+        """Flush the conversation memory and release its file"""
+        self.memory.close()
 
 class VoiceAssistant:
     def __init__(self, cfg: DictConfig):
@@ -107,8 +272,120 @@ class VoiceAssistant:
         
         self.latest_transcription = None
         self.latest_response = None
+        
+        # Pay the models' first-call costs (weight mmap, KV/CUDA allocation, phonemizer load)
+        # at startup instead of on the first utterance
+        self._warmed_up = threading.Event()
+        threading.Thread(target=self._warmup, name="warmup", daemon=True).start()
+
+    def _warmup(self):
+        """Run each model once on throwaway input"""
+        try:
+            # Bypass the silence gate so the model itself runs
+            self.stt.stt_model.stt((16000, np.zeros(16000, dtype=np.int16)))
+            self.llm.generate("warmup")
+            self.tts.text_to_speech("hi.")
+        except Exception as e:
+            print(f"Error warming up models: {e}")
+        finally:
+            self._warmed_up.set()
+
+    @staticmethod
+    def _in_background(make_items: Callable[[], Iterator], name: str,
+                       cancelled: Optional[threading.Event] = None, maxsize: int = 64) -> Iterator:
+        """
+        Start iterating make_items() on a producer thread right away and yield its items as they arrive.
+        
+        The producer stops once cancelled is set. The returned generator sets it when it is closed;
+        a caller that may drop the generator before iterating it must set the event itself.
+        """
+        # Bounded so an abandoned producer cannot run far ahead of playback
+        items = queue.Queue(maxsize=maxsize)
+        done = object()
+        cancelled = cancelled or threading.Event()
+
+        def put(item) -> bool:
+            while not cancelled.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for item in make_items():
+                    if not put(item):
+                        break
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        threading.Thread(target=produce, name=name, daemon=True).start()
+
+        def consume():
+            try:
+                while (item := items.get()) is not done:
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                cancelled.set()
+        return consume()
+
+    def _stream_llm(self, prompt: str) -> Iterator[str]:
+        """Decode on a producer thread so LLM generation continues while the caller runs TTS"""
+        return self._in_background(lambda: self.llm.generate_stream(prompt), "llm-stream")
+
+    def _speak_reply(self, prompt: str) -> Iterator:
+        """
+        Decode a reply and synthesize it sentence by sentence.
+        
+        Yields each sentence's text (a str) followed by its audio chunks; the unterminated
+        rest of the reply comes last. Run through _in_background so synthesis keeps going
+        while the caller sends earlier audio on.
+        """
+        pending = ""
+        llm_start = time.perf_counter_ns()
+        pieces = self._stream_llm(prompt)
+        try:
+            for i, piece in enumerate(pieces):
+                if i == 0:
+                    record_timing("LLM time to first token", time.perf_counter_ns() - llm_start)
+                pending += piece
+                match = SENTENCE_END.search(pending)
+                while match:
+                    sentence, pending = pending[:match.end()].strip(), pending[match.end():]
+                    yield sentence
+                    yield from self.tts.text_to_speech_stream(sentence)
+                    match = SENTENCE_END.search(pending)
+        finally:
+            # Stops decoding too when the reply is cancelled
+            pieces.close()
+        
+        rest = pending.strip()
+        if rest:
+            yield rest
+            yield from self.tts.text_to_speech_stream(rest)
 
     def speech_to_speech(self, audio: tuple[int, np.ndarray]):
+        # The models are not safe to share with the warmup thread
+        self._warmed_up.wait()
+        
+        # Latency as the user hears it: from the end of their utterance to the first audio back
+        turn_start = time.perf_counter_ns()
+        first_audio = True
+        
+        def timed_audio(chunks):
+            nonlocal first_audio
+            for chunk in chunks:
+                if first_audio and not isinstance(chunk, str):
+                    record_timing("time to first audio", time.perf_counter_ns() - turn_start)
+                    first_audio = False
+                yield chunk
+        
         # Convert audio to text using Moonshine
         transcription = self.stt.speech_to_text(audio)
         self.latest_transcription = transcription
@@ -116,36 +393,68 @@ class VoiceAssistant:
 
         yield AdditionalOutputs({"role": "user", "content": transcription})     
 
-        if transcription not in ["", " ", None]:
+        if transcription and NON_EMPTY.search(transcription) and not STT_HALLUCINATION.fullmatch(transcription):
 
             if self.weather._is_weather_query(transcription):
                 print(f"Weather query detected, routing to weather system...")
                 # Route to weather forecast
                 response_text = self.weather.process_weather_query(transcription)
+                unspoken_text = response_text
             else: 
-                # LLM generate response
-                response_text = self.llm.generate(transcription)
+                # LLM generate response: decoding and synthesis run on producer threads, and each
+                # sentence's text is shown right before its audio while the rest is still generated
+                reply_cancelled = threading.Event()
+                reply = self._in_background(lambda: self._speak_reply(transcription), "reply",
+                                            cancelled=reply_cancelled)
+                sentences = []
+                try:
+                    for item in timed_audio(reply):
+                        if isinstance(item, str):
+                            sentences.append(item)
+                            # Replaced in the browser by the final assistant frame below
+                            yield AdditionalOutputs({"role": "assistant", "content": " ".join(sentences), "partial": True})
+                        else:
+                            yield item
+                finally:
+                    reply_cancelled.set()
+                response_text = " ".join(sentences)
+                unspoken_text = ""
                 
             self.latest_response = response_text
             print(f"Response: {response_text}")
             
-            # Add conversation to memory
-            self.llm.add_to_memory(transcription, response_text)
-            
-             # Send response text to browser through AdditionalOutputs
-            yield AdditionalOutputs({"role": "assistant", "content": response_text})
-            
-            # Convert text back to speech using Kokoro
-            audio = self.tts.text_to_speech(response_text)
+            # Start synthesizing the text not spoken yet while the reply is saved and sent to the browser
+            speech = None
+            speech_cancelled = threading.Event()
+            if unspoken_text:
+                speech = self._in_background(lambda: self.tts.text_to_speech_stream(unspoken_text), "tts-stream",
+                                             cancelled=speech_cancelled)
             
-            # Store the response text in a class variable that can be accessed by the web interface
-            self.current_response = response_text
-            
-            yield audio
+            # Stop the synthesis even if the handler is closed before the speech is iterated
+            try:
+                # Add conversation to memory
+                self.llm.add_to_memory(transcription, response_text)
+                
+                # Send response text to browser through AdditionalOutputs
+                yield AdditionalOutputs({"role": "assistant", "content": response_text})
+                
+                # Store the response text in a class variable that can be accessed by the web interface
+                self.current_response = response_text
+                
+                # Play the speech for the rest of the reply (Kokoro)
+                if speech is not None:
+                    yield from timed_audio(speech)
+            finally:
+                speech_cancelled.set()
         else:
             audio = None
             yield audio
     
     def get_memory_info(self) -> dict:
         """Get information about the conversation memory"""
-        return self.llm.get_memory_info()
\ No newline at end of file
+        return self.llm.get_memory_info()
+    
+    def close(self):
+        """Release the conversation memory file and the weather HTTP connections"""
+        self.llm.close()
+        self.weather.close()
\ No newline at end of file
@@ -1,12 +1,52 @@
-import time 
+import inspect
+import threading
+import time
+from collections import deque
 from functools import wraps
 
+# (label, duration in ns) of recent timed calls, drained by a background thread
+_TIMINGS = deque(maxlen=1024)
+_DRAIN_INTERVAL = 1.0
+_drain_started = False
+_drain_lock = threading.Lock()
+
+def _drain_timings():
+    while True:
+        time.sleep(_DRAIN_INTERVAL)
+        while _TIMINGS:
+            label, elapsed_ns = _TIMINGS.popleft()
+            print(f"Time taken for {label}: {elapsed_ns / 1e9:.4f} seconds")
+
+def record_timing(label: str, elapsed_ns: int):
+    """Queue a duration for printing; formatting and output happen off the caller's thread"""
+    global _drain_started
+    if not _drain_started:
+        # Started on first use rather than at import
+        with _drain_lock:
+            if not _drain_started:
+                threading.Thread(target=_drain_timings, name="timings", daemon=True).start()
+                _drain_started = True
+    _TIMINGS.append((label, elapsed_ns))
+
 def timer(func):
+    name = func.__qualname__
+    if inspect.isgeneratorfunction(func):
+        # Streaming calls are timed from the call until the stream is exhausted or closed
+        @wraps(func)
+        def gen_wrapper(*args, **kwargs):
+            start_time = time.perf_counter_ns()
+            gen = func(*args, **kwargs)
+            try:
+                yield from gen
+            finally:
+                gen.close()
+                record_timing(name, time.perf_counter_ns() - start_time)
+        return gen_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         result = func(*args, **kwargs)
-        end_time = time.time()
-        print(f"Time taken for {func.__name__}: {end_time - start_time} seconds")
+        record_timing(name, time.perf_counter_ns() - start_time)
         return result
-    return wrapper
\ No newline at end of file
+    return wrapper
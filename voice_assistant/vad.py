@@ -0,0 +1,69 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from fastrtc import get_silero_model, ReplyOnPause, ReplyOnStopWords
+from fastrtc.utils import AudioChunk, audio_to_float32
+
+def rms(samples: NDArray) -> float:
+    """Root-mean-square level of int16 or float32 audio, on a 0-1 full-scale range"""
+    if samples.size == 0:
+        return 0.0
+    samples = audio_to_float32(samples)
+    return float(np.sqrt(np.mean(np.square(samples))))
+
+class EnergyGatedVAD:
+    """
+    Pause detection model that only runs Silero on chunks louder than the background.
+
+    Chunks whose RMS level is within margin_db of the running noise floor are
+    reported as silence without a neural forward pass. The noise floor is an
+    exponential moving average over the chunks judged silent, so an instance
+    belongs to a single audio stream (see copy()).
+    """
+
+    def __init__(self, margin_db: float = 6.0,
+                 noise_floor_decay: float = 0.99,
+                 initial_noise_floor: float = 1e-3):
+        self.model = get_silero_model()
+        self.margin_db = margin_db
+        self.margin = 10 ** (margin_db / 20)
+        self.noise_floor_decay = noise_floor_decay
+        self.initial_noise_floor = initial_noise_floor
+        self.noise_floor = initial_noise_floor
+
+    def copy(self) -> "EnergyGatedVAD":
+        """A gate with the same settings and a fresh noise floor; the Silero model itself is shared"""
+        return EnergyGatedVAD(self.margin_db, self.noise_floor_decay, self.initial_noise_floor)
+
+    def _update_noise_floor(self, level: float):
+        self.noise_floor = self.noise_floor_decay * self.noise_floor + (1 - self.noise_floor_decay) * level
+
+    def warmup(self):
+        self.model.warmup()
+
+    def vad(self, audio: tuple[int, NDArray[np.int16] | NDArray[np.float32]], options) -> tuple[float, list[AudioChunk]]:
+        level = rms(audio[1])
+        if level < self.noise_floor * self.margin:
+            # Too quiet to be speech: skip Silero entirely
+            self._update_noise_floor(level)
+            return 0.0, []
+
+        speech_duration, chunks = self.model.vad(audio, options)
+        if speech_duration == 0:
+            self._update_noise_floor(level)
+        return speech_duration, chunks
+
+class _PerConnectionGate:
+    """Handler mixin giving each connection (fastrtc copies the handler per connection) its own gate"""
+
+    def copy(self):
+        handler = super().copy()
+        if isinstance(handler.model, EnergyGatedVAD):
+            handler.model = handler.model.copy()
+        return handler
+
+class GatedReplyOnPause(_PerConnectionGate, ReplyOnPause):
+    pass
+
+class GatedReplyOnStopWords(_PerConnectionGate, ReplyOnStopWords):
+    pass